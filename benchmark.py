@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+from grid import Grid
+from grid_graph import GridGraph
+
+STAGES = [
+    "Grid._generate_random_layout",
+    "GridGraph._find_building_nodes",
+    "GridGraph._find_intersections_and_end_nodes",
+    "GridGraph._find_road_end_pairs",
+    "GridGraph._create_edges",
+    "GridGraph.output_graphviz",
+    "Grid.visualize_grid",
+]
+RENDER_STAGES = {"GridGraph.output_graphviz", "Grid.visualize_grid"}
+
+
+def _pipeline(size: int, seed: int, vectorized: bool, render: bool):
+    """Yield (stage, callable) for every stage of one build, in order. Each callable runs its stage."""
+    state = {}
+
+    def generate():
+        # Grid construction is the layout generation plus the (cheap) warehouse draw.
+        state["grid"] = Grid(size, size, seed=seed)
+
+    def building_nodes():
+        state["graph"] = GridGraph(state["grid"], vectorized=vectorized, build=False)
+        state["graph"]._find_building_nodes()
+
+    yield STAGES[0], generate
+    yield STAGES[1], building_nodes
+    yield STAGES[2], lambda: state["graph"]._find_intersections_and_end_nodes()
+    yield STAGES[3], lambda: state["graph"]._find_road_end_pairs()
+    # _create_edges pairs the road ends again before walking the roads.
+    yield STAGES[4], lambda: state["graph"]._create_edges()
+    if render:
+        yield STAGES[5], lambda: state["graph"].output_graphviz()
+        yield STAGES[6], lambda: state["grid"].visualize_grid()
+
+
+def _run_stages(size: int, seed: int, vectorized: bool, render: bool, measure_memory: bool) -> dict:
+    results = {}
+    for stage, run in _pipeline(size, seed, vectorized, render):
+        if measure_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            run()
+        except Exception as error:
+            if stage not in RENDER_STAGES:
+                raise
+            results[stage] = {"skipped": f"{type(error).__name__}: {error}"}
+            continue
+        elapsed = time.perf_counter() - start
+        results[stage] = {"seconds": elapsed}
+        if measure_memory:
+            results[stage]["peak_bytes"] = tracemalloc.get_traced_memory()[1] - baseline
+    return results
+
+
+def run_benchmarks(sizes, seeds, repeat: int = 3, vectorized: bool = True, render_max_size: int = 40, measure_memory: bool = True) -> dict:
+    """Time every stage for each size and seed.
+
+    Times are the best of repeat runs without tracing; peak memory comes from one extra run under
+    tracemalloc. Rendering stages only run up to render_max_size and are recorded as skipped when
+    they fail (e.g. without the Graphviz executables). Outputs are written to a temporary directory.
+    """
+    records = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in sizes:
+                render = size <= render_max_size
+                for seed in seeds:
+                    timings = [_run_stages(size, seed, vectorized, render, False) for _ in range(repeat)]
+                    memory = {}
+                    if measure_memory:
+                        tracemalloc.start()
+                        try:
+                            memory = _run_stages(size, seed, vectorized, render, True)
+                        finally:
+                            tracemalloc.stop()
+                    for stage in timings[0]:
+                        record = {"size": size, "seed": seed, "stage": stage}
+                        if "skipped" in timings[0][stage]:
+                            record["skipped"] = timings[0][stage]["skipped"]
+                        else:
+                            record["seconds"] = min(timing[stage]["seconds"] for timing in timings)
+                            if "peak_bytes" in memory.get(stage, {}):
+                                record["peak_bytes"] = memory[stage]["peak_bytes"]
+                        records.append(record)
+                        print(_format_record(record), file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "networkx": nx.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "vectorized": vectorized,
+            "repeat": repeat,
+        },
+        "results": records,
+    }
+
+
+def _format_record(record: dict) -> str:
+    if "skipped" in record:
+        return f"{record['size']:>6} {record['seed']:>4} {record['stage']:<45} skipped ({record['skipped']})"
+    memory = f"{record['peak_bytes'] / 2 ** 20:10.2f} MiB" if "peak_bytes" in record else ""
+    return f"{record['size']:>6} {record['seed']:>4} {record['stage']:<45} {record['seconds'] * 1000:12.3f} ms {memory}"
+
+
+def _medians(results: dict, field: str) -> dict:
+    """Return the median of field over the seeds, keyed by (size, stage)."""
+    values = {}
+    for record in results["results"]:
+        if field in record:
+            values.setdefault((record["size"], record["stage"]), []).append(record[field])
+    return {key: statistics.median(samples) for key, samples in values.items()}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, min_seconds: float = 0.001, min_bytes: int = 64 * 1024) -> list[str]:
+    """Compare two result files stage by stage and return the regressions.
+
+    A stage regresses when its median over the seeds grows by more than threshold (relative) and by
+    more than min_seconds or min_bytes (absolute), so that noise on tiny stages is ignored.
+    """
+    regressions = []
+    for field, floor, unit in (("seconds", min_seconds, "s"), ("peak_bytes", min_bytes, "B")):
+        before, after = _medians(baseline, field), _medians(current, field)
+        for key in sorted(before.keys() & after.keys()):
+            old, new = before[key], after[key]
+            change = (new - old) / old if old else float("inf")
+            flag = change > threshold and new - old > floor
+            line = f"{key[0]:>6} {key[1]:<45} {field:<10} {old:14.6g} -> {new:14.6g} {unit} {change:+8.1%}"
+            print(("REGRESSION " if flag else "           ") + line)
+            if flag:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks for grid generation and graph building.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="sweep grid sizes and seeds and write JSON results")
+    run.add_argument("--sizes", type=int, nargs="+", default=[20, 80, 200, 500, 1000, 2000])
+    run.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--reference", action="store_true", help="benchmark the per-cell reference stages")
+    run.add_argument("--render-max-size", type=int, default=40, help="largest size for which the PNG renderers run")
+    run.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    run.add_argument("--output", default="benchmark_results.json")
+
+    diff = commands.add_parser("compare", help="compare results against a baseline and flag regressions")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    diff.add_argument("--min-seconds", type=float, default=0.001)
+    diff.add_argument("--min-bytes", type=int, default=64 * 1024)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run_benchmarks(args.sizes, args.seeds, args.repeat, not args.reference, args.render_max_size, not args.no_memory)
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    regressions = compare(baseline, current, args.threshold, args.min_seconds, args.min_bytes)
+    print(f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
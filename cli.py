@@ -0,0 +1,194 @@
+import argparse
+import os
+import sys
+import time
+
+# Only argparse is imported up front: numpy, the builder and the renderers are imported by the
+# commands that need them, so a headless build never loads matplotlib, graphviz or networkx.
+
+EXTENSIONS = {"dot": "dot", "graphml": "graphml", "binary": "bin", "json": "json", "ndjson": "ndjson"}
+
+
+def _grid_path(path: str) -> str:
+    """Accept a grid written by Grid.save either as <path>, <path>.npy or <path>.json."""
+    root, extension = os.path.splitext(path)
+    return root if extension in (".npy", ".json") else path
+
+
+def _output_path(pattern: str, **fields) -> str:
+    path = pattern.format(**fields)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+def _report(name: str, start: float, **values):
+    values["seconds"] = f"{time.perf_counter() - start:.3f}"
+    print(f"{name}: " + " ".join(f"{key}={value}" for key, value in values.items()))
+
+
+def _grids(args):
+    """Yield (name, grid) for every grid file given, or for every seed when --size is used instead."""
+    from grid import Grid
+
+    if args.grids and args.size:
+        raise SystemExit("Give grid files or --size, not both.")
+    if not args.grids and not args.size:
+        raise SystemExit("Give grid files or --size.")
+    for path in args.grids:
+        path = _grid_path(path)
+        yield os.path.basename(path), Grid.load(path, mmap_mode="r" if args.mmap else None)
+    if args.size:
+        width, height = args.size
+        for seed in args.seeds:
+            yield f"grid_{width}x{height}_{seed}", Grid(width, height, seed=seed, max_road_width=args.max_road_width)
+
+
+def generate(args) -> int:
+    from grid import Grid
+
+    width, height = args.size
+    for seed in args.seeds:
+        start = time.perf_counter()
+        grid = Grid(width, height, seed=seed, max_road_width=args.max_road_width)
+        path = _output_path(args.output, width=width, height=height, seed=seed)
+        grid.save(path)
+        _report(path, start, buildings=grid.next_building_id - 1, warehouses=len(grid.warehouses))
+    return 0
+
+
+def build(args) -> int:
+    from grid_graph import GridGraph
+    from graph_cache import GraphCache
+
+    cache = GraphCache(args.cache) if args.cache else None
+    for name, grid in _grids(args):
+        start = time.perf_counter()
+        graph = GridGraph(grid, workers=args.workers, executor=args.executor, tile_size=args.tile_size, cache=cache, run_length=args.run_length)
+        path = _output_path(args.output, name=name, ext=EXTENSIONS[args.format])
+        graph.export(path, args.format)
+        core = graph.get_compact_graph()
+        _report(path, start, nodes=len(core), edges=core.edge_count())
+    return 0
+
+
+def export(args) -> int:
+    from export import export_graph, read_binary
+
+    for path in args.graphs:
+        start = time.perf_counter()
+        graph = read_binary(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        output = _output_path(args.output, name=name, ext=EXTENSIONS[args.format])
+        export_graph(graph, output, args.format)
+        _report(output, start, nodes=len(graph), edges=graph.edge_count())
+    return 0
+
+
+def render(args) -> int:
+    import raster
+
+    for name, grid in _grids(args):
+        start = time.perf_counter()
+        if args.tiles:
+            path = _output_path(args.output, name=name, ext="tiles")
+            raster.save_tiles(grid, path, args.tile_size, args.pixels_per_cell, not args.no_labels)
+        elif args.overview:
+            path = _output_path(args.output, name=name, ext="png")
+            raster.save_overview(grid, path, args.overview)
+        else:
+            path = _output_path(args.output, name=name, ext="png")
+            raster.save_png(grid, path, args.pixels_per_cell, not args.no_labels)
+        if args.graph:
+            from grid_graph import GridGraph
+            GridGraph(grid).output_graphviz(_output_path(args.output, name=name + "_graph", ext="gv"))
+        _report(path, start)
+    return 0
+
+
+def bench(args) -> int:
+    import benchmark
+
+    return benchmark.main(args.arguments)
+
+
+def serve(args) -> int:
+    import asyncio
+    import service
+
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix_socket, workers=args.workers, queue_size=args.queue_size,
+                                  cache_directory=args.cache))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _add_grid_inputs(parser):
+    parser.add_argument("grids", nargs="*", help="grids written by Grid.save or `generate`")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="generate the grids instead of reading them")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--max-road-width", type=int, default=2)
+    parser.add_argument("--mmap", action="store_true", help="memory-map the grid files instead of reading them")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate city grids, build their graphs and export or render them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("generate", help="generate grids and save them as <output>.npy and <output>.json")
+    command.add_argument("size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"))
+    command.add_argument("--seeds", type=int, nargs="+", default=[0])
+    command.add_argument("--max-road-width", type=int, default=2)
+    command.add_argument("--output", default="grid_{width}x{height}_{seed}", help="path pattern with {width}, {height} and {seed}")
+    command.set_defaults(run=generate)
+
+    command = commands.add_parser("build", help="build the graph of every grid and export it")
+    _add_grid_inputs(command)
+    command.add_argument("--format", choices=sorted(EXTENSIONS), default="binary")
+    command.add_argument("--output", default="{name}.{ext}", help="path pattern with {name} and {ext}")
+    command.add_argument("--workers", type=int, default=1)
+    command.add_argument("--executor", choices=["thread", "process"], default="process",
+                         help="pool for --workers above 1; the walks and tile scans are mostly Python, so threads do not run them in parallel")
+    command.add_argument("--tile-size", type=int)
+    command.add_argument("--run-length", action="store_true", help="walk the roads over run-length encoded rows and columns")
+    command.add_argument("--cache", help="graph cache directory")
+    command.set_defaults(run=build)
+
+    command = commands.add_parser("export", help="convert graphs written in the binary format to another format")
+    command.add_argument("graphs", nargs="+")
+    command.add_argument("--format", choices=sorted(EXTENSIONS), required=True)
+    command.add_argument("--output", default="{name}.{ext}", help="path pattern with {name} and {ext}")
+    command.set_defaults(run=export)
+
+    command = commands.add_parser("render", help="render grids to PNG, and their graphs with Graphviz")
+    _add_grid_inputs(command)
+    command.add_argument("--output", default="{name}.{ext}", help="path pattern with {name} and {ext}")
+    command.add_argument("--pixels-per-cell", type=int, default=4)
+    command.add_argument("--no-labels", action="store_true")
+    command.add_argument("--overview", type=int, metavar="MAX_SIZE", help="one pixel per block of cells, at most MAX_SIZE pixels wide")
+    command.add_argument("--tiles", action="store_true", help="write a directory of PNG tiles")
+    command.add_argument("--tile-size", type=int, default=512)
+    command.add_argument("--graph", action="store_true", help="also render the graph with the dot executable")
+    command.set_defaults(run=render)
+
+    command = commands.add_parser("bench", help="run benchmark.py with the remaining arguments")
+    command.add_argument("arguments", nargs=argparse.REMAINDER)
+    command.set_defaults(run=bench)
+
+    command = commands.add_parser("serve", help="build graphs for other tools over HTTP on localhost, see service.py")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8765)
+    command.add_argument("--unix-socket", help="listen on this Unix socket instead of host and port")
+    command.add_argument("--workers", type=int, help="build processes, one per CPU by default")
+    command.add_argument("--queue-size", type=int, default=64, help="builds that may wait before requests are turned away")
+    command.add_argument("--cache", help="graph cache directory shared by the workers")
+    command.set_defaults(run=serve)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
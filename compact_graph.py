@@ -0,0 +1,190 @@
+import numpy as np
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+class NodeType(StrEnum):
+    BUILDING = "building"
+    WAREHOUSE = "warehouse"
+    INTERSECTION = "intersection"
+    ROAD_END = "road_end"
+
+
+NODE_TYPES = list(NodeType)
+NODE_TYPE_CODES = {type: code for code, type in enumerate(NODE_TYPES)}
+
+
+class CompactGraph:
+    """Undirected weighted graph with integer node ids, struct-of-arrays node columns and CSR edges.
+
+    Nodes are keyed by their bounding box while the graph is built. freeze() turns the columns and
+    edges into arrays: bboxes (n, 4), types (codes into NODE_TYPES), building_ids (-1 for road nodes),
+    and indptr/indices/weights in CSR form with both directions of every edge. version grows with
+    every change, so results derived from the graph can tell when they are stale.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._bboxes = []
+        self._types = []
+        self._building_ids = []
+        self._edges = {}
+        self._frozen = False
+        self._networkx = None
+        self.version = 0
+
+    @classmethod
+    def from_records(cls, nodes, edges) -> "CompactGraph":
+        """Rebuild a graph from the rows of iter_node_rows and iter_edge_ids, keeping ids and edge order."""
+        graph = cls()
+        for bbox, code, building_id in nodes:
+            graph._ids[bbox] = len(graph._bboxes)
+            graph._bboxes.append(bbox)
+            graph._types.append(code)
+            graph._building_ids.append(building_id)
+        for a, b, weight in edges:
+            graph._edges[(a, b) if a < b else (b, a)] = weight
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add_node(self, key: tuple, type: NodeType, id: int = -1) -> int:
+        """Add a node, or update the attributes of an existing one like nx.Graph.add_node. Returns its id."""
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self._bboxes)
+            self._ids[key] = node
+            self._bboxes.append(key)
+            self._types.append(NODE_TYPE_CODES[type])
+            self._building_ids.append(id)
+        else:
+            self._types[node] = NODE_TYPE_CODES[type]
+            self._building_ids[node] = id
+        self._touch()
+        return node
+
+    def add_nodes(self, keys: list[tuple], type, ids=None):
+        """Add many nodes at once. type and ids are either one value for every node or one per node."""
+        types = [type] * len(keys) if isinstance(type, NodeType) else type
+        ids = [-1] * len(keys) if ids is None else ids
+        if len(set(keys)) != len(keys) or not self._ids.keys().isdisjoint(keys):
+            for key, node_type, id in zip(keys, types, ids):
+                self.add_node(key, node_type, id)
+            return
+
+        start = len(self._bboxes)
+        self._ids.update(zip(keys, range(start, start + len(keys))))
+        self._bboxes.extend(keys)
+        self._types.extend(NODE_TYPE_CODES[node_type] for node_type in types)
+        self._building_ids.extend(ids)
+        self._touch()
+
+    def add_edge(self, u: tuple, v: tuple, weight: int):
+        """Add an edge between two node keys. Adding it again only replaces the weight, like nx.Graph.add_edge."""
+        a, b = self._ids[u], self._ids[v]
+        self._edges[(a, b) if a < b else (b, a)] = weight
+        self._touch()
+
+    def _touch(self):
+        self._frozen = False
+        self._networkx = None
+        self.version += 1
+
+    def node_id(self, key: tuple) -> int:
+        return self._ids[key]
+
+    def node_key(self, node: int) -> tuple:
+        return self._bboxes[node]
+
+    def keys_of_type(self, *types: NodeType) -> list[tuple]:
+        """Return the keys of the nodes of the given types in insertion order."""
+        codes = {NODE_TYPE_CODES[type] for type in types}
+        return [key for key, code in zip(self._bboxes, self._types) if code in codes]
+
+    def freeze(self):
+        """Build the node columns, the per-type index arrays and the CSR edge arrays."""
+        if self._frozen:
+            return
+        count = len(self._bboxes)
+        self.bboxes = np.array(self._bboxes, dtype=np.int64).reshape(count, 4)
+        self.types = np.array(self._types, dtype=np.int8)
+        self.building_ids = np.array(self._building_ids, dtype=np.int64)
+        self._type_index = {type: np.nonzero(self.types == code)[0] for type, code in NODE_TYPE_CODES.items()}
+        buildings = np.nonzero(self.building_ids >= 0)[0]
+        # One spare -1 at the end answers every id outside the table.
+        self._node_of_building = np.full(self.building_ids.max(initial=-1) + 2, -1, dtype=np.int64)
+        self._node_of_building[self.building_ids[buildings]] = buildings
+
+        self.edge_list = np.array(list(self._edges), dtype=np.int64).reshape(len(self._edges), 2)
+        self.edge_weights = np.array(list(self._edges.values()), dtype=np.int64)
+        sources = np.concatenate((self.edge_list[:, 0], self.edge_list[:, 1]))
+        targets = np.concatenate((self.edge_list[:, 1], self.edge_list[:, 0]))
+        weights = np.concatenate((self.edge_weights, self.edge_weights))
+        order = np.argsort(sources, kind='stable')
+        self.indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=self.indptr[1:])
+        self.indices = targets[order]
+        self.weights = weights[order]
+        self._frozen = True
+
+    def nodes_of_type(self, *types: NodeType) -> np.ndarray:
+        """Return the ids of the nodes of the given types as a sorted index array."""
+        self.freeze()
+        if len(types) == 1:
+            return self._type_index[types[0]]
+        return np.sort(np.concatenate([self._type_index[type] for type in types]))
+
+    def building_nodes(self, building_ids) -> np.ndarray:
+        """Return the node ids of the given building ids. Raises ValueError for ids without a node."""
+        self.freeze()
+        building_ids = np.asarray(building_ids, dtype=np.int64)
+        known = (building_ids >= 0) & (building_ids < len(self._node_of_building))
+        nodes = self._node_of_building[np.where(known, building_ids, -1)]
+        if (nodes < 0).any():
+            raise ValueError(f"There is no building {building_ids[nodes < 0].flat[0]} in the graph.")
+        return nodes
+
+    def neighbors(self, node: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the neighbour ids of a node and the weights of the edges to them."""
+        self.freeze()
+        return self.indices[self.indptr[node]:self.indptr[node + 1]], self.weights[self.indptr[node]:self.indptr[node + 1]]
+
+    def edge_count(self) -> int:
+        return len(self._edges)
+
+    def iter_nodes(self):
+        """Yield (key, attributes) for every node in id order, with the attributes networkx nodes carry."""
+        for key, code, building_id in zip(self._bboxes, self._types, self._building_ids):
+            type = NODE_TYPES[code]
+            if type == NodeType.BUILDING or type == NodeType.WAREHOUSE:
+                yield key, {'type': type, 'id': building_id}
+            else:
+                yield key, {'type': type}
+
+    def iter_node_rows(self):
+        """Yield (bbox, type code, building id) for every node in id order."""
+        return zip(self._bboxes, self._types, self._building_ids)
+
+    def iter_edge_ids(self):
+        """Yield (u, v, weight) with u < v for every edge in the order it was first added."""
+        for (a, b), weight in self._edges.items():
+            yield a, b, weight
+
+    def iter_edges(self):
+        """Yield (key_u, key_v, weight) for every edge in the order it was first added."""
+        for (a, b), weight in self._edges.items():
+            yield self._bboxes[a], self._bboxes[b], weight
+
+    def to_networkx(self) -> "nx.Graph":
+        """Build (once) the networkx view keyed by bounding boxes."""
+        if self._networkx is None:
+            import networkx as nx
+            graph = nx.Graph()
+            graph.add_nodes_from(self.iter_nodes())
+            graph.add_edges_from((u, v, {'weight': weight}) for u, v, weight in self.iter_edges())
+            self._networkx = graph
+        return self._networkx
@@ -0,0 +1,228 @@
+import heapq
+import time
+import numpy as np
+from compact_graph import CompactGraph, NodeType, NODE_TYPE_CODES
+
+# Witness searches give up after settling this many nodes; a shortcut is then added even if it is not needed.
+WITNESS_SETTLE_LIMIT = 64
+
+
+class ContractionIndex:
+    """Contraction hierarchy over a compact graph, for point to point shortest path queries.
+
+    Nodes are contracted one by one, adding a shortcut between two neighbours whenever the path
+    through the contracted node is the only shortest one. The next node is the one whose contraction
+    adds the fewest shortcuts for the edges it removes, with buildings and warehouses winning ties, so
+    the buildings hanging off the roads go first and intersections and road ends form the top of
+    the hierarchy. The index keeps, for every
+    node, the edges to the neighbours contracted after it (upward CSR arrays, with the contracted
+    middle node of each shortcut, or -1), and a query is a bidirectional Dijkstra that only climbs.
+    """
+
+    def __init__(self, rank, indptr, targets, weights, middles, node_count: int, edge_count: int, preprocessing_seconds: float):
+        self.rank = rank
+        self.indptr = indptr
+        self.targets = targets
+        self.weights = weights
+        self.middles = middles
+        self.node_count = node_count
+        self.edge_count = edge_count
+        self.preprocessing_seconds = preprocessing_seconds
+        self._indptr, self._targets, self._weights = indptr.tolist(), targets.tolist(), weights.tolist()
+        sources = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        shortcuts = np.nonzero(middles >= 0)[0]
+        self._middle = dict(zip(zip(sources[shortcuts].tolist(), targets[shortcuts].tolist()), middles[shortcuts].tolist()))
+
+    @classmethod
+    def build(cls, graph: CompactGraph) -> "ContractionIndex":
+        start = time.perf_counter()
+        graph.freeze()
+        count = len(graph)
+        adjacency = [dict() for _ in range(count)]
+        for (a, b), weight in zip(graph.edge_list.tolist(), graph.edge_weights.tolist()):
+            adjacency[a][b] = adjacency[b][a] = (weight, -1)
+        leaf = np.isin(graph.types, [NODE_TYPE_CODES[NodeType.BUILDING], NODE_TYPE_CODES[NodeType.WAREHOUSE]]).tolist()
+
+        contracted = [False] * count
+        deleted_neighbours = [0] * count
+        rank = np.empty(count, dtype=np.int64)
+        upward = [None] * count
+
+        def priority(node):
+            shortcuts = _shortcuts(adjacency, contracted, node)
+            return (len(shortcuts) - len(adjacency[node]) + deleted_neighbours[node], 0 if leaf[node] else 1)
+
+        heap = [(priority(node), node) for node in range(count)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, node = heapq.heappop(heap)
+            if contracted[node]:
+                continue
+            # Lazy update: contract the node only if it is still the best once its priority is fresh.
+            current = priority(node)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, node))
+                continue
+
+            shortcuts = _shortcuts(adjacency, contracted, node)
+            upward[node] = sorted(adjacency[node].items())
+            contracted[node] = True
+            rank[node] = order
+            order += 1
+            for neighbour in adjacency[node]:
+                del adjacency[neighbour][node]
+                deleted_neighbours[neighbour] += 1
+            for u, w, weight in shortcuts:
+                if w not in adjacency[u] or adjacency[u][w][0] > weight:
+                    adjacency[u][w] = adjacency[w][u] = (weight, node)
+            adjacency[node] = {}
+
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in upward], out=indptr[1:])
+        edges = [edge for edges in upward for edge in edges]
+        targets = np.array([target for target, _ in edges], dtype=np.int64)
+        weights = np.array([weight for _, (weight, _) in edges], dtype=np.int64)
+        middles = np.array([middle for _, (_, middle) in edges], dtype=np.int64)
+        return cls(rank, indptr, targets, weights, middles, count, graph.edge_count(), time.perf_counter() - start)
+
+    def shortcut_count(self) -> int:
+        return int(np.count_nonzero(self.middles >= 0))
+
+    def nbytes(self) -> int:
+        return self.rank.nbytes + self.indptr.nbytes + self.targets.nbytes + self.weights.nbytes + self.middles.nbytes
+
+    def report(self) -> dict:
+        return {
+            "nodes": self.node_count,
+            "edges": self.edge_count,
+            "shortcuts": self.shortcut_count(),
+            "bytes": self.nbytes(),
+            "preprocessing_seconds": self.preprocessing_seconds,
+        }
+
+    def save(self, path: str):
+        """Write the index to an .npz file, e.g. next to the graph written by export.write_binary."""
+        np.savez(path, rank=self.rank, indptr=self.indptr, targets=self.targets, weights=self.weights, middles=self.middles,
+                 counts=np.array([self.node_count, self.edge_count]), preprocessing_seconds=np.array(self.preprocessing_seconds))
+
+    @classmethod
+    def load(cls, path: str, graph: CompactGraph | None = None) -> "ContractionIndex":
+        """Read an index written by save. With graph, check that the index was built for a graph of its size."""
+        with np.load(path) as data:
+            node_count, edge_count = data['counts'].tolist()
+            index = cls(data['rank'], data['indptr'], data['targets'], data['weights'], data['middles'],
+                        node_count, edge_count, float(data['preprocessing_seconds']))
+        if graph is not None and (len(graph) != node_count or graph.edge_count() != edge_count):
+            raise ValueError(f"{path} was built for another graph.")
+        return index
+
+    def _search(self, distance: dict, parent: dict, heap: list, other: dict, best: list):
+        """Settle one node of one side of the bidirectional search."""
+        node_distance, node = heapq.heappop(heap)
+        if node_distance > distance[node]:
+            return
+        if node in other and node_distance + other[node] < best[0]:
+            best[0], best[1] = node_distance + other[node], node
+        for edge in range(self._indptr[node], self._indptr[node + 1]):
+            target, candidate = self._targets[edge], node_distance + self._weights[edge]
+            if candidate < distance.get(target, float('inf')):
+                distance[target] = candidate
+                parent[target] = node
+                heapq.heappush(heap, (candidate, target))
+
+    def _query(self, source: int, target: int):
+        forward, backward = {source: 0}, {target: 0}
+        forward_parent, backward_parent = {}, {}
+        forward_heap, backward_heap = [(0, source)], [(0, target)]
+        best = [float('inf'), -1]
+        while forward_heap or backward_heap:
+            # Upward searches stop once neither side can still improve on the best meeting node.
+            forward_open = bool(forward_heap) and forward_heap[0][0] < best[0]
+            backward_open = bool(backward_heap) and backward_heap[0][0] < best[0]
+            if not forward_open and not backward_open:
+                break
+            if forward_open:
+                self._search(forward, forward_parent, forward_heap, backward, best)
+            if backward_open:
+                self._search(backward, backward_parent, backward_heap, forward, best)
+        return best[0], best[1], forward_parent, backward_parent
+
+    def distance(self, source: int, target: int) -> float:
+        """Return the shortest path length between two node ids, inf when they are not connected."""
+        return self._query(source, target)[0]
+
+    def path(self, source: int, target: int) -> list[int]:
+        """Return the node ids of a shortest path from source to target, with the shortcuts unpacked; empty when not connected."""
+        length, meeting, forward_parent, backward_parent = self._query(source, target)
+        if meeting < 0:
+            return []
+        up = [meeting]
+        while up[-1] != source:
+            up.append(forward_parent[up[-1]])
+        down = [meeting]
+        while down[-1] != target:
+            down.append(backward_parent[down[-1]])
+        hops = up[::-1] + down[1:]
+
+        path = [source]
+        for a, b in zip(hops, hops[1:]):
+            path.extend(self._unpack(a, b))
+        return path
+
+    def _unpack(self, a: int, b: int) -> list[int]:
+        """Return the original nodes after a on the edge a-b, expanding shortcuts through their middle nodes."""
+        low, high = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+        middle = self._middle.get((low, high), -1)
+        if middle < 0:
+            return [b]
+        return self._unpack(a, middle) + self._unpack(middle, b)
+
+    def building_distance(self, graph: CompactGraph, source: int, target: int) -> float:
+        """Return the shortest path length between two buildings given by building id."""
+        source_node, target_node = graph.building_nodes([source, target]).tolist()
+        return self.distance(source_node, target_node)
+
+    def building_path(self, graph: CompactGraph, source: int, target: int) -> list[tuple]:
+        """Return the node keys of a shortest path between two buildings given by building id."""
+        source_node, target_node = graph.building_nodes([source, target]).tolist()
+        return [graph.node_key(node) for node in self.path(source_node, target_node)]
+
+
+def _shortcuts(adjacency: list[dict], contracted: list, node: int) -> list[tuple]:
+    """Return the (u, w, weight) shortcuts contracting node needs: pairs of neighbours with no witness path around it."""
+    neighbours = list(adjacency[node].items())
+    shortcuts = []
+    for index, (u, (weight_u, _)) in enumerate(neighbours):
+        targets = {w: weight_u + weight_w for w, (weight_w, _) in neighbours[index + 1:]}
+        if not targets:
+            continue
+        witness = _witness_distances(adjacency, node, u, set(targets), max(targets.values()))
+        for w, through in targets.items():
+            if witness.get(w, float('inf')) > through:
+                shortcuts.append((u, w, through))
+    return shortcuts
+
+
+def _witness_distances(adjacency: list[dict], avoided: int, source: int, targets: set, limit: int) -> dict:
+    """Dijkstra from source that skips the avoided node, stopping past limit or after WITNESS_SETTLE_LIMIT nodes."""
+    distance = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    remaining = set(targets)
+    while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+        node_distance, node = heapq.heappop(heap)
+        if node_distance > distance[node]:
+            continue
+        if node_distance > limit:
+            break
+        settled += 1
+        remaining.discard(node)
+        for neighbour, (weight, _) in adjacency[node].items():
+            if neighbour == avoided:
+                continue
+            candidate = node_distance + weight
+            if candidate < distance.get(neighbour, float('inf')):
+                distance[neighbour] = candidate
+                heapq.heappush(heap, (candidate, neighbour))
+    return distance
@@ -0,0 +1,189 @@
+import json
+import struct
+from itertools import islice
+import numpy as np
+from compact_graph import CompactGraph, NodeType, NODE_TYPES
+
+# Records written per file.write call; the exporters never hold more than one chunk besides the graph itself.
+EXPORT_CHUNK_SIZE = 4096
+
+COLOR_MAP = {
+    NodeType.INTERSECTION: 'dodgerblue',
+    NodeType.ROAD_END: 'green3',
+    NodeType.BUILDING: 'gold',
+    NodeType.WAREHOUSE: 'firebrick1'
+}
+
+SHAPE_MAP = {
+    NodeType.INTERSECTION: 'octagon',
+    NodeType.ROAD_END: 'square',
+    NodeType.BUILDING: 'house',
+    NodeType.WAREHOUSE: 'invhouse'
+}
+
+BINARY_MAGIC = b"CGGB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sIQQ")
+BINARY_NODE_DTYPE = np.dtype([('min_x', '<i4'), ('min_y', '<i4'), ('max_x', '<i4'), ('max_y', '<i4'), ('type', 'i1'), ('building_id', '<i8')])
+BINARY_EDGE_DTYPE = np.dtype([('u', '<u4'), ('v', '<u4'), ('weight', '<u4')])
+
+
+def _chunks(iterable, size: int = EXPORT_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _write_lines(file, lines):
+    for chunk in _chunks(lines):
+        file.write("".join(chunk))
+
+
+def _is_building(code: int) -> bool:
+    return NODE_TYPES[code] in (NodeType.BUILDING, NodeType.WAREHOUSE)
+
+
+def write_dot(graph: CompactGraph, path: str, scale: float = 72.0):
+    """Write the graph as undirected DOT with every node pinned at its bounding box centre.
+
+    pos is in points, scale per cell, with rows growing downwards, so `neato -n -Tpng` renders it
+    without running a layout.
+    """
+    def nodes():
+        for node, ((min_x, min_y, max_x, max_y), code, building_id) in enumerate(graph.iter_node_rows()):
+            type = NODE_TYPES[code]
+            label = f"{type}({building_id})\\n{(min_x, min_y, max_x, max_y)}" if _is_building(code) else f"{type}\\n{(min_x, min_y, max_x, max_y)}"
+            x, y = (min_y + max_y + 1) / 2 * scale, -(min_x + max_x + 1) / 2 * scale
+            yield f'\t{node} [label="{label}" shape={SHAPE_MAP[type]} fillcolor={COLOR_MAP[type]} pos="{x:g},{y:g}"]\n'
+
+    def edges():
+        for u, v, weight in graph.iter_edge_ids():
+            yield f'\t{u} -- {v} [label="{weight}" penwidth={weight}]\n'
+
+    with open(path, "w") as file:
+        file.write("graph grid_graph {\n\tnode [style=filled]\n")
+        _write_lines(file, nodes())
+        _write_lines(file, edges())
+        file.write("}\n")
+
+
+def write_graphml(graph: CompactGraph, path: str):
+    """Write the graph as GraphML, with the node type, building id and bounding box as node data and the weight as edge data."""
+    def nodes():
+        for node, ((min_x, min_y, max_x, max_y), code, building_id) in enumerate(graph.iter_node_rows()):
+            yield (f'    <node id="n{node}"><data key="type">{NODE_TYPES[code]}</data><data key="building_id">{building_id}</data>'
+                   f'<data key="min_x">{min_x}</data><data key="min_y">{min_y}</data>'
+                   f'<data key="max_x">{max_x}</data><data key="max_y">{max_y}</data></node>\n')
+
+    def edges():
+        for u, v, weight in graph.iter_edge_ids():
+            yield f'    <edge source="n{u}" target="n{v}"><data key="weight">{weight}</data></edge>\n'
+
+    with open(path, "w") as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                   '  <key id="type" for="node" attr.name="type" attr.type="string"/>\n'
+                   '  <key id="building_id" for="node" attr.name="building_id" attr.type="long"/>\n')
+        for name in ("min_x", "min_y", "max_x", "max_y"):
+            file.write(f'  <key id="{name}" for="node" attr.name="{name}" attr.type="int"/>\n')
+        file.write('  <key id="weight" for="edge" attr.name="weight" attr.type="int"/>\n'
+                   '  <graph id="grid_graph" edgedefault="undirected">\n')
+        _write_lines(file, nodes())
+        _write_lines(file, edges())
+        file.write("  </graph>\n</graphml>\n")
+
+
+def write_binary(graph: CompactGraph, path: str):
+    """Write the graph in a compact little-endian binary format.
+
+    A header (magic, version, node count, edge count) is followed by one BINARY_NODE_DTYPE record
+    per node in id order and one BINARY_EDGE_DTYPE record per edge in insertion order.
+    """
+    with open(path, "wb") as file:
+        write_binary_to(graph, file)
+
+
+def write_binary_to(graph: CompactGraph, file):
+    if len(graph) >= 2 ** 32:
+        raise ValueError("The binary format holds at most 2**32 - 1 nodes.")
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(graph), graph.edge_count()))
+    for chunk in _chunks(graph.iter_node_rows()):
+        file.write(np.array([(*bbox, code, building_id) for bbox, code, building_id in chunk], dtype=BINARY_NODE_DTYPE).tobytes())
+    for chunk in _chunks(graph.iter_edge_ids()):
+        file.write(np.array(chunk, dtype=BINARY_EDGE_DTYPE).tobytes())
+
+
+def read_binary(path: str) -> CompactGraph:
+    """Read a graph written by write_binary."""
+    with open(path, "rb") as file:
+        return read_binary_from(file)
+
+
+def read_binary_from(file) -> CompactGraph:
+    """Read one graph written by write_binary_to, leaving the file positioned right after it."""
+    header = file.read(BINARY_HEADER.size)
+    if len(header) != BINARY_HEADER.size:
+        raise ValueError(f"{file.name} is truncated.")
+    magic, version, node_count, edge_count = BINARY_HEADER.unpack(header)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f"{file.name} is not a version {BINARY_VERSION} binary graph.")
+    nodes = np.frombuffer(file.read(node_count * BINARY_NODE_DTYPE.itemsize), dtype=BINARY_NODE_DTYPE)
+    edges = np.frombuffer(file.read(edge_count * BINARY_EDGE_DTYPE.itemsize), dtype=BINARY_EDGE_DTYPE)
+    if len(nodes) != node_count or len(edges) != edge_count:
+        raise ValueError(f"{file.name} is truncated.")
+
+    bboxes = zip(nodes['min_x'].tolist(), nodes['min_y'].tolist(), nodes['max_x'].tolist(), nodes['max_y'].tolist())
+    return CompactGraph.from_records(zip(bboxes, nodes['type'].tolist(), nodes['building_id'].tolist()),
+                                     zip(edges['u'].tolist(), edges['v'].tolist(), edges['weight'].tolist()))
+
+
+def _node_record(node: int, bbox, code: int, building_id: int) -> dict:
+    record = {"id": node, "type": str(NODE_TYPES[code]), "bbox": list(bbox)}
+    if _is_building(code):
+        record["building_id"] = building_id
+    return record
+
+
+def write_json(graph: CompactGraph, path: str):
+    """Write the graph in networkx node-link form: nx.node_link_graph(data, edges="edges") reads it back with integer ids."""
+    def nodes():
+        for node, (bbox, code, building_id) in enumerate(graph.iter_node_rows()):
+            yield ("" if node == 0 else ",\n") + json.dumps(_node_record(node, bbox, code, building_id))
+
+    def edges():
+        for index, (u, v, weight) in enumerate(graph.iter_edge_ids()):
+            yield ("" if index == 0 else ",\n") + json.dumps({"source": u, "target": v, "weight": weight})
+
+    with open(path, "w") as file:
+        file.write('{"directed": false, "multigraph": false, "graph": {},\n"nodes": [\n')
+        _write_lines(file, nodes())
+        file.write('],\n"edges": [\n')
+        _write_lines(file, edges())
+        file.write("]}\n")
+
+
+def write_ndjson(graph: CompactGraph, path: str):
+    """Write one JSON object per line: every node ({"kind": "node", ...}) and then every edge ({"kind": "edge", ...})."""
+    def records():
+        for node, (bbox, code, building_id) in enumerate(graph.iter_node_rows()):
+            yield json.dumps({"kind": "node", **_node_record(node, bbox, code, building_id)}) + "\n"
+        for u, v, weight in graph.iter_edge_ids():
+            yield json.dumps({"kind": "edge", "source": u, "target": v, "weight": weight}) + "\n"
+
+    with open(path, "w") as file:
+        _write_lines(file, records())
+
+
+EXPORTERS = {
+    "dot": write_dot,
+    "graphml": write_graphml,
+    "binary": write_binary,
+    "json": write_json,
+    "ndjson": write_ndjson,
+}
+
+
+def export_graph(graph: CompactGraph, path: str, format: str):
+    if format not in EXPORTERS:
+        raise ValueError(f"Format must be one of {', '.join(EXPORTERS)}.")
+    EXPORTERS[format](graph, path)
@@ -0,0 +1,180 @@
+import numpy as np
+from grid import CellType
+from runs import group_strips
+
+# Fields are computed in bands of rows (or columns) of about this many cells, to bound the temporaries.
+FIELD_BAND_CELLS = 1 << 22
+
+
+def _sweep(cost: np.ndarray, steps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """For every line of cost, return min over k <= j of cost[k] + j - k and the nearest k attaining it."""
+    shifted = cost - steps
+    best = np.minimum.accumulate(shifted, axis=1)
+    index = np.maximum.accumulate(np.where(shifted == best, steps, 0), axis=1)
+    return best + steps, index
+
+
+def line_transform(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return min over k of cost[k] + |j - k| at every j of every line of cost, and the k attaining it.
+
+    With cost 0 at the sources and a large value elsewhere this is the distance along the line to
+    the nearest source. Ties between both sides go to the source before j.
+    """
+    cost = np.asarray(cost, dtype=np.int64)
+    steps = np.arange(cost.shape[1])
+    forward_distance, forward_index = _sweep(cost, steps)
+    backward_distance, backward_index = _sweep(cost[:, ::-1], steps)
+    backward_distance, backward_index = backward_distance[:, ::-1], (len(steps) - 1 - backward_index)[:, ::-1]
+    forward = forward_distance <= backward_distance
+    return np.where(forward, forward_distance, backward_distance), np.where(forward, forward_index, backward_index)
+
+
+def distance_field(matrix: np.ndarray, is_source) -> tuple[np.ndarray, np.ndarray]:
+    """Return the Manhattan distance from every cell to the nearest source cell, and that cell's flat index.
+
+    is_source maps a block of the matrix to its boolean source mask. The transform is separable:
+    first the distance to the nearest source in the same column, then along the rows over those
+    distances, which is what a 4-connected multi-source BFS on an open grid gives. Both are -1 when
+    the matrix has no source.
+    """
+    rows, cols = matrix.shape
+    unreachable = rows + cols
+    column_distance = np.empty((rows, cols), dtype=np.int32)
+    nearest_row = np.empty((rows, cols), dtype=np.int32)
+    band = max(FIELD_BAND_CELLS // max(rows, 1), 1)
+    for first in range(0, cols, band):
+        block = np.asarray(matrix[:, first:first + band])
+        distance, index = line_transform(np.where(is_source(block), 0, unreachable).T)
+        column_distance[:, first:first + band] = np.minimum(distance, unreachable).T
+        nearest_row[:, first:first + band] = index.T
+
+    distance = np.empty((rows, cols), dtype=np.int32)
+    nearest = np.empty((rows, cols), dtype=np.int64)
+    band = max(FIELD_BAND_CELLS // max(cols, 1), 1)
+    for first in range(0, rows, band):
+        band_distance, column = line_transform(column_distance[first:first + band])
+        row = np.take_along_axis(nearest_row[first:first + band], column, axis=1)
+        found = band_distance < unreachable
+        distance[first:first + band] = np.where(found, band_distance, -1)
+        nearest[first:first + band] = np.where(found, row * cols + column, -1)
+    return distance, nearest
+
+
+class GridFields:
+    """Raster fields over a grid: distance to and nearest road cell, warehouse and road strip for every cell.
+
+    Each field is computed on first use in one vectorized pass and kept until the grid is edited
+    through its methods (anything that appends to grid.edits); call invalidate() after writing to
+    grid.grid directly. Fields are (rows, columns) arrays in matrix coordinates, so a lookup is
+    field[row, column] for one cell or for arrays of them. Distances count 4-connected steps and
+    ignore what lies in between, -1 meaning there is no such feature.
+    """
+
+    def __init__(self, grid):
+        self._grid = grid
+        self._fields = {}
+        self._version = len(grid.edits)
+
+    def invalidate(self):
+        self._fields = {}
+
+    def _field(self, name: str, compute):
+        if self._version != len(self._grid.edits):
+            self._fields = {}
+            self._version = len(self._grid.edits)
+        if name not in self._fields:
+            self._fields[name] = compute()
+        return self._fields[name]
+
+    def _roads(self) -> tuple[np.ndarray, np.ndarray]:
+        return distance_field(self._grid.grid, lambda block: block == CellType.ROAD)
+
+    def _warehouses(self) -> tuple[np.ndarray, np.ndarray]:
+        warehouses = np.fromiter(self._grid.warehouses, dtype=np.int64)
+        distance, nearest = distance_field(self._grid.grid, lambda block: np.isin(block, warehouses))
+        flat = self._grid.grid.reshape(-1)
+        return distance, np.where(nearest >= 0, flat[np.maximum(nearest, 0)], -1)
+
+    def road_distance(self) -> np.ndarray:
+        return self._field("roads", self._roads)[0]
+
+    def nearest_road(self) -> np.ndarray:
+        """Return the flat index (row * columns + column) of the nearest road cell of every cell."""
+        return self._field("roads", self._roads)[1]
+
+    def nearest_road_cells(self, rows, cols) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (rows, columns) of the nearest road cell of each given cell, -1 when there are no roads."""
+        nearest = self.nearest_road()[rows, cols]
+        return np.where(nearest >= 0, nearest // self._grid.width, -1), np.where(nearest >= 0, nearest % self._grid.width, -1)
+
+    def warehouse_distance(self) -> np.ndarray:
+        return self._field("warehouses", self._warehouses)[0]
+
+    def nearest_warehouse(self) -> np.ndarray:
+        """Return the building id of the warehouse nearest to every cell."""
+        return self._field("warehouses", self._warehouses)[1]
+
+    def _strip_lines(self):
+        full_rows = np.ones(self._grid.height, dtype=bool)
+        full_cols = np.ones(self._grid.width, dtype=bool)
+        band = max(FIELD_BAND_CELLS // max(self._grid.width, 1), 1)
+        for first in range(0, self._grid.height, band):
+            road = np.asarray(self._grid.grid[first:first + band]) == CellType.ROAD
+            full_rows[first:first + band] = road.all(axis=1)
+            full_cols &= road.all(axis=0)
+
+        strips = [("horizontal", start, width) for start, width in group_strips(full_rows)]
+        strips += [("vertical", start, width) for start, width in group_strips(full_cols)]
+        lines = []
+        offset = 0
+        for full in (full_rows, full_cols):
+            # The strip index of each full line, then the distance to and strip of the nearest one.
+            starts = full & ~np.r_[False, full[:-1]]
+            strip_of_line = np.where(full, np.cumsum(starts) - 1 + offset, -1)
+            offset += int(starts.sum())
+            distance, index = line_transform(np.where(full, 0, len(full))[np.newaxis, :])
+            found = distance[0] < len(full)
+            lines.append((np.where(found, distance[0], -1), np.where(found, strip_of_line[index[0]], -1)))
+        return strips, lines
+
+    def road_strips(self) -> list[tuple[str, int, int]]:
+        """Return the full-length road strips as (orientation, start, width): horizontal ones by row, then vertical ones by column."""
+        return self._field("strip_lines", self._strip_lines)[0]
+
+    def _cell_strips(self, rows, cols) -> tuple[np.ndarray, np.ndarray]:
+        (row_distance, row_strip), (column_distance, column_strip) = self._field("strip_lines", self._strip_lines)[1]
+        row_distance, column_distance = row_distance[rows], column_distance[cols]
+        row_distance = np.where(row_distance < 0, np.iinfo(np.int64).max, row_distance)
+        column_distance = np.where(column_distance < 0, np.iinfo(np.int64).max, column_distance)
+        horizontal = row_distance <= column_distance
+        distance = np.where(horizontal, row_distance, column_distance)
+        return np.where(distance == np.iinfo(np.int64).max, -1, distance), np.where(horizontal, row_strip[rows], column_strip[cols])
+
+    def nearest_strip(self) -> np.ndarray:
+        """Return the index into road_strips() of the strip nearest to every cell; horizontal strips win ties."""
+        def compute():
+            rows, cols = np.indices((self._grid.height, self._grid.width), sparse=True)
+            return self._cell_strips(rows, cols)[1].astype(np.int32)
+        return self._field("nearest_strip", compute)
+
+    def _building_strips(self) -> np.ndarray:
+        strip_count = len(self.road_strips()) + 1
+        best = np.full(self._grid.next_building_id, np.iinfo(np.int64).max, dtype=np.int64)
+        band = max(FIELD_BAND_CELLS // max(self._grid.width, 1), 1)
+        for first in range(0, self._grid.height, band):
+            block = np.asarray(self._grid.grid[first:first + band])
+            rows, cols = np.nonzero(block >= CellType.BUILDING)
+            distance, strip = self._cell_strips(rows + first, cols)
+            reached = strip >= 0
+            np.minimum.at(best, block[rows, cols][reached].astype(np.int64), distance[reached] * strip_count + strip[reached])
+        return np.where(best < np.iinfo(np.int64).max, best % strip_count, -1)
+
+    def serving_strips(self, building_ids) -> np.ndarray:
+        """Return the road strip serving each building: the strip nearest to any of its cells, -1 when there are none.
+
+        Raises ValueError for ids that are not buildings of the grid.
+        """
+        building_ids = np.asarray(building_ids, dtype=np.int64)
+        if ((building_ids < CellType.BUILDING) | (building_ids >= self._grid.next_building_id)).any():
+            raise ValueError("Unknown building id.")
+        return self._field("building_strips", self._building_strips)[building_ids]
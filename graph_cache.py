@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from compact_graph import CompactGraph
+from export import write_binary_to, read_binary_from
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: eviction is then only safe from a single process.
+    fcntl = None
+
+ENTRY_SUFFIX = ".graph"
+# Grids are hashed in slices of about this many bytes, so memory-mapped grids are never loaded whole.
+HASH_BLOCK_BYTES = 1 << 24
+
+
+def grid_key(grid, builder_version) -> str:
+    """Hash the grid matrix (shape, dtype and bytes), the warehouse set and the builder version."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{builder_version}|{grid.grid.shape}|{grid.grid.dtype.str}|{sorted(grid.warehouses)}|".encode())
+    rows = max(HASH_BLOCK_BYTES // max(grid.grid[0].nbytes, 1), 1)
+    for start in range(0, len(grid.grid), rows):
+        digest.update(np.ascontiguousarray(grid.grid[start:start + rows]).data)
+    return digest.hexdigest()
+
+
+class GraphCache:
+    """Content-addressed on-disk cache of built graphs, shared by every process that opens the same directory.
+
+    Each entry is one <key>.graph file holding the compact graph in the export.write_binary format
+    followed by the building table as .npy data. Entries are written to a temporary file and renamed
+    into place, so readers never see partial files. A hit touches the entry's mtime, and after each
+    store the least recently used entries are removed, under a file lock, until the directory holds
+    at most max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        if max_bytes < 0:
+            raise ValueError("Cache size must not be negative.")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def load(self, key: str) -> tuple[CompactGraph, np.ndarray] | None:
+        """Return the cached (graph, building table) for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                graph = read_binary_from(file)
+                buildings = np.load(file)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except ValueError:
+            self._remove(path)
+            self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process since it was read; what was read is still a valid entry.
+            pass
+        self.stats["hits"] += 1
+        return graph, buildings
+
+    def store(self, key: str, graph: CompactGraph, buildings: np.ndarray):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                write_binary_to(graph, file)
+                np.save(file, buildings)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            self._remove(temporary)
+            raise
+        self.stats["stores"] += 1
+        self.evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def entries(self) -> list[tuple[str, int, float]]:
+        """Return (key, size in bytes, last use time) for every entry, least recently used first."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.name[:-len(ENTRY_SUFFIX)], info.st_size, info.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        with self._lock():
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for key, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(self._path(key))
+                total -= size
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock():
+            for key, _, _ in self.entries():
+                self._remove(self._path(key))
@@ -1,7 +1,9 @@
-import random
+import json
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from enum import IntEnum
-import matplotlib.pyplot as plt
+from instrumentation import BuildStats, stage, profiling
 
 class CellType(IntEnum):
     EMPTY = -1
@@ -9,21 +11,108 @@ class CellType(IntEnum):
     BUILDING = 1
 
 
+def summed_area_table(mask: np.ndarray) -> np.ndarray:
+    """Return the summed-area table of mask, padded with a leading row and column of zeros."""
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(mask, axis=0), axis=1, out=table[1:, 1:])
+    return table
+
+
+def grid_dtype(max_building_id: int) -> np.dtype:
+    """Return the smallest signed integer dtype that holds EMPTY and every building id up to max_building_id."""
+    # A signed type holds ids up to -(its minimum) - 1, so size it by -(max_building_id + 1).
+    return np.result_type(np.min_scalar_type(-(max_building_id + 1)), np.min_scalar_type(CellType.EMPTY))
+
+
+RANDOM_BLOCK_SIZE = 4096
+
+
 class Grid:
-    def __init__(self, width: int, height: int, max_road_width: int = 2, min_building_size: int = 2, max_building_size: int = 6):
+    def __init__(self, width: int, height: int, max_road_width: int = 2, min_building_size: int = 2, max_building_size: int = 6, fast: bool = True,
+                 seed: int | np.random.SeedSequence | np.random.Generator | None = None, stats: BuildStats | None = None):
         if width < 6 or height < 6:
             raise ValueError("Width and height must be at least 6.")
         self.width = width
         self.height = height
-        self.grid = np.full((height, width), CellType.EMPTY, dtype=int)
+        max_building_count = (width * height) // max(min_building_size, 1) ** 2
+        self.grid = np.full((height, width), CellType.EMPTY, dtype=grid_dtype(max_building_count))
         self.next_building_id = 1
         self._max_road_width = max_road_width
         self._min_building_size = min_building_size 
         self._max_building_size = max_building_size
+        self._fast = fast
+        self._rng = np.random.default_rng(seed)
+        self._random_buffer = []
+        self._random_position = 0
         self.warehouses = set()
-        self._generate_random_layout()
-        self._generate_warehouses()
+        self.edits = []
+        self._stats = stats
+        self._fields = None
+        with profiling(stats):
+            with stage(stats, "Grid._generate_random_layout"):
+                self._generate_random_layout()
+            with stage(stats, "Grid._generate_warehouses"):
+                self._generate_warehouses()
     
+    @classmethod
+    def from_array(cls, grid: np.ndarray, warehouses, next_building_id: int | None = None, max_road_width: int = 2,
+                   min_building_size: int = 2, max_building_size: int = 6) -> "Grid":
+        """Wrap an existing grid matrix without generating a layout."""
+        instance = cls.__new__(cls)
+        instance.height, instance.width = grid.shape
+        instance.grid = grid
+        instance.next_building_id = int(grid.max()) + 1 if next_building_id is None else int(next_building_id)
+        instance.warehouses = set(int(id) for id in warehouses)
+        instance._max_road_width = max_road_width
+        instance._min_building_size = min_building_size
+        instance._max_building_size = max_building_size
+        instance._fast = True
+        instance._rng = np.random.default_rng()
+        instance._random_buffer = []
+        instance._random_position = 0
+        instance.edits = []
+        instance._stats = None
+        instance._fields = None
+        return instance
+
+    def save(self, path: str):
+        """Save the grid matrix to <path>.npy and its metadata to <path>.json."""
+        np.save(f"{path}.npy", self.grid)
+        metadata = {
+            "width": self.width,
+            "height": self.height,
+            "dtype": self.grid.dtype.str,
+            "next_building_id": self.next_building_id,
+            "warehouses": sorted(self.warehouses),
+            "max_road_width": self._max_road_width,
+            "min_building_size": self._min_building_size,
+            "max_building_size": self._max_building_size,
+        }
+        with open(f"{path}.json", "w") as file:
+            json.dump(metadata, file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str | None = None) -> "Grid":
+        """Load a grid written by save.
+
+        With mmap_mode ('r', 'r+' or 'c', as for np.load) the matrix is an np.memmap and is only
+        read from disk where it is accessed, e.g. tile by tile by GridGraph(grid, tile_size=...).
+        """
+        grid = np.load(f"{path}.npy", mmap_mode=mmap_mode)
+        with open(f"{path}.json") as file:
+            metadata = json.load(file)
+        return cls.from_array(grid, metadata["warehouses"], metadata["next_building_id"], metadata["max_road_width"],
+                              metadata["min_building_size"], metadata["max_building_size"])
+
+    def _randint(self, low: int, high: int) -> int:
+        """Draw an integer in [low, high] from the grid's generator, buffering the draws in blocks."""
+        if self._random_position == len(self._random_buffer):
+            self._random_buffer = self._rng.random(RANDOM_BLOCK_SIZE).tolist()
+            self._random_position = 0
+        value = self._random_buffer[self._random_position]
+        self._random_position += 1
+        return low + int(value * (high - low + 1))
+
     def _is_valid_position(self, x: int, y: int) -> bool:
         """Check if the given position is within grid bounds."""
         return 0 <= x < self.width and 0 <= y < self.height
@@ -83,13 +172,106 @@ class Grid:
         
         return False
 
+    def _count_in_rect(self, table: np.ndarray, start_x: int, start_y: int, end_x: int, end_y: int) -> int:
+        """Count the cells of a summed-area table inside [start, end), clipped to the grid."""
+        start_x, start_y = max(start_x, 0), max(start_y, 0)
+        end_x, end_y = min(end_x, self.width), min(end_y, self.height)
+        return int(table[end_y, end_x] - table[start_y, end_x] - table[end_y, start_x] + table[start_y, start_x])
+
     def reset(self):
         """Reset the grid and generate a new random layout."""
         self._generate_random_layout()
         self._generate_warehouses()
+        self.edits.append(("reset", (0, 0, self.width, self.height)))
+
+    def place_building(self, start_x: int, start_y: int, width: int, height: int) -> int:
+        """Place a building on empty cells and return its id. Raises ValueError if placement is invalid."""
+        if start_x < 0 or start_y < 0 or start_x + width > self.width or start_y + height > self.height or width < 1 or height < 1:
+            raise ValueError("Building must lie within the grid.")
+        area = self.grid[start_y:start_y + height, start_x:start_x + width]
+        if (area != CellType.EMPTY).any():
+            raise ValueError("Building must be placed on empty cells.")
+
+        building_id = self.next_building_id
+        # Generation sizes the dtype for the buildings it can place; widen it once ids outgrow it.
+        dtype = np.result_type(self.grid.dtype, grid_dtype(building_id))
+        if dtype != self.grid.dtype:
+            self.grid = self.grid.astype(dtype)
+            area = self.grid[start_y:start_y + height, start_x:start_x + width]
+        area[:] = building_id
+        self.next_building_id += 1
+        self.edits.append(("building", (start_x, start_y, start_x + width, start_y + height)))
+        return building_id
+
+    def remove_building(self, building_id: int):
+        """Clear the cells of a building and drop it from the warehouses."""
+        y, x = np.nonzero(self.grid == building_id)
+        if building_id < CellType.BUILDING or len(x) == 0:
+            raise ValueError(f"There is no building {building_id}.")
+
+        self.grid[y, x] = CellType.EMPTY
+        self.warehouses.discard(building_id)
+        self.edits.append(("building", (int(x.min()), int(y.min()), int(x.max()) + 1, int(y.max()) + 1)))
+
+    def _strip(self, orientation: str, start: int, width: int) -> tuple[slice, slice, tuple]:
+        if orientation == "horizontal":
+            if start < 0 or width < 1 or start + width > self.height:
+                raise ValueError("Road strip must lie within the grid.")
+            return slice(start, start + width), slice(None), (0, start, self.width, start + width)
+        if orientation == "vertical":
+            if start < 0 or width < 1 or start + width > self.width:
+                raise ValueError("Road strip must lie within the grid.")
+            return slice(None), slice(start, start + width), (start, 0, start + width, self.height)
+        raise ValueError("Orientation must be 'horizontal' or 'vertical'.")
+
+    def add_road(self, orientation: str, start: int, width: int = 1):
+        """Add a full-length road strip: rows start..start+width-1 when horizontal, columns when vertical."""
+        rows, cols, rect = self._strip(orientation, start, width)
+        area = self.grid[rows, cols]
+        if (area >= CellType.BUILDING).any():
+            raise ValueError("Road strip crosses a building.")
+
+        area[:] = CellType.ROAD
+        self.edits.append(("road", rect))
+
+    def close_road(self, orientation: str, start: int, width: int = 1):
+        """Turn a whole road strip back into empty cells, keeping the roads that cross it.
+
+        The strip must be all road and not part of a wider strip. A cell is kept when the cells on
+        both sides of the strip are road, or the grid edge. Raises ValueError otherwise.
+        """
+        rows, cols, rect = self._strip(orientation, start, width)
+        area = self.grid[rows, cols]
+        lines = self.grid if orientation == "horizontal" else self.grid.T
+        if len(lines) == width:
+            raise ValueError("Cannot close a road strip that covers the whole grid.")
+        if (area != CellType.ROAD).any():
+            raise ValueError("Only road cells can be closed.")
+        if any(0 <= line < len(lines) and (lines[line] == CellType.ROAD).all() for line in (start - 1, start + width)):
+            raise ValueError("Road strip is part of a wider one; close the whole strip.")
+
+        edge = np.full(lines.shape[1], True)
+        before = lines[start - 1] == CellType.ROAD if start > 0 else edge
+        after = lines[start + width] == CellType.ROAD if start + width < len(lines) else edge
+        crossing = before & after
+        area[:] = np.where(crossing[np.newaxis, :] if orientation == "horizontal" else crossing[:, np.newaxis], area, CellType.EMPTY)
+        self.edits.append(("road", rect))
+
+    def set_warehouse(self, building_id: int, is_warehouse: bool = True):
+        """Mark or unmark a building as a warehouse."""
+        if building_id < CellType.BUILDING or building_id >= self.next_building_id or not (self.grid == building_id).any():
+            raise ValueError(f"There is no building {building_id}.")
+        if is_warehouse:
+            self.warehouses.add(building_id)
+        else:
+            self.warehouses.discard(building_id)
+        self.edits.append(("warehouse", None))
 
     def _generate_random_layout(self):
         """Generate a random layout with roads first, then buildings."""
+        if self._fast:
+            self._generate_random_layout_fast()
+            return
 
         self.grid.fill(CellType.EMPTY)
         self.next_building_id = 1
@@ -98,32 +280,34 @@ class Grid:
 
         y = 2
         while y < self.height - 2:
-            road_width = random.randint(1, self._max_road_width)
+            road_width = self._randint(1, self._max_road_width)
             for w in range(road_width):
                 if y + w < self.height:
                     for x in range(self.width):
                         if self.grid[y + w, x] != CellType.ROAD:
                             self.grid[y + w, x] = CellType.ROAD
                             road_cells += 1
-            y += road_width + self._min_building_size + random.randint(0, self._max_building_size - self._min_building_size)
+            y += road_width + self._min_building_size + self._randint(0, self._max_building_size - self._min_building_size)
 
         x = 2
         while x < self.width - 2:
-            road_width = random.randint(1, self._max_road_width)
+            road_width = self._randint(1, self._max_road_width)
             for w in range(road_width):
                 if x + w < self.width:
                     for y in range(self.height):
                         if self.grid[y, x + w] != CellType.ROAD:
                             self.grid[y, x + w] = CellType.ROAD
                             road_cells += 1
-            x += road_width + self._min_building_size + random.randint(0, self._max_building_size - self._min_building_size)
+            x += road_width + self._min_building_size + self._randint(0, self._max_building_size - self._min_building_size)
 
         attempts = 200
+        tried = 0
         while attempts > 0:
-            width = random.randint(self._min_building_size, self._max_building_size)
-            height = random.randint(self._min_building_size, self._max_building_size)
-            x = random.randint(0, self.width - width)
-            y = random.randint(0, self.height - height)
+            tried += 1
+            width = self._randint(self._min_building_size, self._max_building_size)
+            height = self._randint(self._min_building_size, self._max_building_size)
+            x = self._randint(0, self.width - width)
+            y = self._randint(0, self.height - height)
             
             if self._is_adjacent_to_road(x, y, width, height):
                 if self._place_building(x, y, width, height):
@@ -131,6 +315,55 @@ class Grid:
                     continue
             
             attempts -= 1
+        self._count_placements(tried)
+
+    def _generate_random_layout_fast(self):
+        """Generate the same layout as the cell by cell generator, painting with slices and testing with summed-area tables."""
+        self.grid.fill(CellType.EMPTY)
+        self.next_building_id = 1
+
+        y = 2
+        while y < self.height - 2:
+            road_width = self._randint(1, self._max_road_width)
+            self.grid[y:y + road_width, :] = CellType.ROAD
+            y += road_width + self._min_building_size + self._randint(0, self._max_building_size - self._min_building_size)
+
+        x = 2
+        while x < self.width - 2:
+            road_width = self._randint(1, self._max_road_width)
+            self.grid[:, x:x + road_width] = CellType.ROAD
+            x += road_width + self._min_building_size + self._randint(0, self._max_building_size - self._min_building_size)
+
+        # Roads do not change while buildings are placed, so their table stays exact. A building
+        # fits if the rectangle grown by one cell touches a road and the rectangle itself holds no
+        # road and no building; the building check reads at most max_building_size² cells.
+        roads = summed_area_table(self.grid == CellType.ROAD)
+        attempts = 200
+        tried = 0
+        while attempts > 0:
+            tried += 1
+            width = self._randint(self._min_building_size, self._max_building_size)
+            height = self._randint(self._min_building_size, self._max_building_size)
+            x = self._randint(0, self.width - width)
+            y = self._randint(0, self.height - height)
+
+            if (self._count_in_rect(roads, x - 1, y - 1, x + width + 1, y + height + 1) > 0
+                    and self._count_in_rect(roads, x, y, x + width, y + height) == 0):
+                area = self.grid[y:y + height, x:x + width]
+                if area.max() == CellType.EMPTY:
+                    area[:] = self.next_building_id
+                    self.next_building_id += 1
+                    attempts = 200
+                    continue
+
+            attempts -= 1
+        self._count_placements(tried)
+
+    def _count_placements(self, tried: int):
+        if self._stats is not None:
+            self._stats.count("building_placements_tried", tried)
+            self._stats.count("buildings_placed", self.next_building_id - 1)
+            self._stats.count("road_cells", np.count_nonzero(self.grid == CellType.ROAD))
 
     def __str__(self) -> str:
         """Return a string representation of the grid."""
@@ -150,13 +383,30 @@ class Grid:
         """Generate warehouses in the grid."""
         self.warehouses = set() 
         warehouse_count = np.ceil(0.1 * (self.next_building_id - 1))
-        warehouse_ids = random.sample(range(1, self.next_building_id), int(warehouse_count))
+        warehouse_ids = self._rng.choice(np.arange(1, self.next_building_id), size=int(warehouse_count), replace=False).tolist()
         for warehouse_id in warehouse_ids:
             self.warehouses.add(warehouse_id)
 
-    def visualize_grid(self):
-        """Visualize the grid and save it as a PNG file, showing building values."""
-        
+    def get_fields(self):
+        """Return the GridFields of this grid (distances to and nearest roads, warehouses and road strips), see fields.py."""
+        if self._fields is None:
+            from fields import GridFields
+            self._fields = GridFields(self)
+        return self._fields
+
+    def visualize_grid(self, path: str = "grid.png", pixels_per_cell: int = 32, labels: bool = True, fast: bool = True):
+        """Visualize the grid and save it as a PNG file, showing building values.
+
+        The fast path colours the cells through a lookup table and writes the PNG with Pillow, see
+        raster.py for tiles and overviews of large grids. fast=False draws it cell by cell with matplotlib.
+        """
+        if fast:
+            from raster import save_png
+            save_png(self, path, pixels_per_cell, labels)
+            return
+
+        import matplotlib.pyplot as plt
+
         WHITE = (1.0, 1.0, 1.0)  # Empty (-1)
         BLACK = (0.0, 0.0, 0.0)  # Road (0)
         BLUE = (0.0, 0.0, 1.0)   # Building (>= 1)
@@ -184,10 +434,55 @@ class Grid:
         plt.axis('on')
         plt.xticks(ticks=np.arange(self.width), labels=np.arange(self.width))
         plt.yticks(ticks=np.arange(self.height), labels=np.arange(self.height))
-        plt.savefig('grid.png', bbox_inches='tight', pad_inches=0)
+        plt.savefig(path, bbox_inches='tight', pad_inches=0)
         plt.close()
 
 
+def _generate_dataset_grid(task) -> tuple[np.ndarray, list[int], int]:
+    width, height, seed, options = task
+    grid = Grid(width, height, seed=seed, **options)
+    return grid.grid, sorted(grid.warehouses), grid.next_building_id
+
+
+def generate_dataset(path: str, count: int, width: int, height: int, seed: int | None = None, workers: int | None = None, **options) -> int:
+    """Generate count grids on a process pool and save them in one compressed .npz file.
+
+    Every grid gets its own child of np.random.SeedSequence(seed), so the dataset is reproducible
+    and does not depend on the number of workers. Warehouses are stored flat with per-grid offsets.
+    Returns the entropy of the root seed sequence, an int that regenerates the same dataset when
+    passed back as seed; it is also stored in the file as a string.
+    """
+    root = np.random.SeedSequence(seed)
+    tasks = [(width, height, child, options) for child in root.spawn(count)]
+
+    max_building_count = (width * height) // max(options.get('min_building_size', 2), 1) ** 2
+    grids = np.empty((count, height, width), dtype=grid_dtype(max_building_count))
+    next_building_ids = np.empty(count, dtype=np.int64)
+    warehouses = []
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    with ProcessPoolExecutor(workers) as pool:
+        chunksize = max(1, count // (4 * (workers or os.cpu_count() or 1)))
+        for index, (grid, grid_warehouses, next_building_id) in enumerate(pool.map(_generate_dataset_grid, tasks, chunksize=chunksize)):
+            grids[index] = grid
+            next_building_ids[index] = next_building_id
+            warehouses.extend(grid_warehouses)
+            offsets[index + 1] = len(warehouses)
+
+    np.savez_compressed(path, grids=grids, warehouses=np.array(warehouses, dtype=np.int64), warehouse_offsets=offsets,
+                        next_building_ids=next_building_ids, entropy=np.array(str(root.entropy)))
+    return root.entropy
+
+
+def load_dataset(path: str) -> list[Grid]:
+    """Load the grids written by generate_dataset."""
+    with np.load(path) as data:
+        grids = data['grids']
+        warehouses = data['warehouses']
+        offsets = data['warehouse_offsets']
+        next_building_ids = data['next_building_ids']
+    return [Grid.from_array(grids[index], warehouses[offsets[index]:offsets[index + 1]], next_building_ids[index]) for index in range(len(grids))]
+
+
 if __name__ == "__main__":
     grid = Grid(10, 10)
 
@@ -1,42 +1,261 @@
-import networkx as nx
+import mmap
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from grid import Grid, CellType
 import numpy as np
-from enum import StrEnum
-from graphviz import Digraph
-from networkx.drawing.nx_agraph import to_agraph
+from compact_graph import CompactGraph, NodeType
+from road_features import ORTHOGONAL_DIRECTIONS, DIAGONAL_DIRECTIONS, find_feature_boxes, group_intersection_corners, group_end_corners
+from tiling import iter_tiles, read_tile, scan_tile, merge_building_extents
+from runs import RunLengthGrid
+from instrumentation import BuildStats, stage, profiling
+from export import COLOR_MAP, SHAPE_MAP, export_graph, write_dot
+from graph_cache import GraphCache, grid_key
+from routing import WarehouseRouter
+from contraction import ContractionIndex
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+INCREMENTAL_TILE_SIZE = 64
+# Cells read around every tile: the corners' neighbours are classified too.
+TILE_HALO = 2
+
+# Part of every graph cache key: bump it whenever the graph built from a given grid changes.
+BUILDER_VERSION = 3
+
+BUILDING_TABLE_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('min_x', np.int64),
+    ('min_y', np.int64),
+    ('max_x', np.int64),
+    ('max_y', np.int64),
+    ('cell_count', np.int64),
+    ('is_warehouse', np.bool_),
+])
+
+
+class RoadIndex:
+    """Cell lookups used to walk roads: building ids come from the grid matrix, intersections are listed per row and column.
+
+    With runs (a RunLengthGrid of the matrix) a walk only visits the building runs and intersection
+    spans along the road instead of reading every cell beside it.
+    """
+
+    def __init__(self, matrix: np.ndarray, building_nodes: dict, intersection_nodes: list, runs: RunLengthGrid | None = None):
+        self._matrix = matrix
+        self._runs = runs
+        self._rows, self._cols = matrix.shape
+        self._building_nodes = building_nodes
+        self._intersection_nodes = intersection_nodes
+        self._intersections_by_row = defaultdict(list)
+        self._intersections_by_column = defaultdict(list)
+        for index, (min_x, min_y, max_x, max_y) in enumerate(intersection_nodes):
+            for x in range(min_x, max_x + 1):
+                self._intersections_by_row[x].append(index)
+            for y in range(min_y, max_y + 1):
+                self._intersections_by_column[y].append(index)
+
+    def __getstate__(self):
+        # A memory-mapped grid is reopened by the worker instead of being copied into the pickle.
+        state = self.__dict__.copy()
+        if isinstance(self._matrix, np.memmap) and isinstance(self._matrix.base, mmap.mmap):
+            state['_matrix'] = (self._matrix.filename, self._matrix.offset, self._matrix.shape, self._matrix.dtype.str)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['_matrix'], tuple):
+            filename, offset, shape, dtype = state['_matrix']
+            state['_matrix'] = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+        self.__dict__.update(state)
+
+    def _lookup(self, raster, x, y, default):
+        """Read raster at the given cells, returning default for the cells off the grid."""
+        x, y = np.broadcast_arrays(x, y)
+        inside = (0 <= x) & (x < self._rows) & (0 <= y) & (y < self._cols)
+        values = np.full(x.shape, default, dtype=raster.dtype)
+        values[inside] = raster[x[inside], y[inside]]
+        return values
+
+    def _crossing_starts(self, direction, start, steps) -> dict[int, list[int]]:
+        """Return the indexes of the intersections the road crosses, keyed by the step where it enters each one.
+
+        Intersection boxes may overlap, so several can start at the same step; they are listed in
+        node order, the order the reference scan tests them in.
+        """
+        if direction == "horizontal":
+            spans = [(self._intersection_nodes[index][0], index) for index in self._intersections_by_column.get(start, [])]
+        else:
+            spans = [(self._intersection_nodes[index][1], index) for index in self._intersections_by_row.get(start, [])]
+        starts = defaultdict(list)
+        for first, index in spans:
+            if first < steps:
+                starts[first].append(index)
+        return starts
+
+    def _cell_events(self, direction, start, end, steps):
+        """Yield (building ids, intersection indexes) at every step with a building beside the road or entering an intersection.
+
+        An intersection is on the chain from the step the road enters it, so later steps inside it need no event.
+        """
+        if direction == "horizontal":
+            sides = [(np.arange(steps), end + 1), (np.arange(steps), start - 1)]
+        else:
+            sides = [(start - 1, np.arange(steps)), (end + 1, np.arange(steps))]
+        first_side = self._lookup(self._matrix, *sides[0], CellType.EMPTY)
+        second_side = self._lookup(self._matrix, *sides[1], CellType.EMPTY)
+        crossings = self._crossing_starts(direction, start, steps)
+        events = np.nonzero((first_side >= CellType.BUILDING) | (second_side >= CellType.BUILDING))[0]
+        building = int(CellType.BUILDING)
+        for step in sorted(set(events.tolist()) | crossings.keys()):
+            ids = (int(first_side[step]), int(second_side[step]))
+            yield sorted(id for id in ids if id >= building), crossings.get(step, [])
+
+    def _run_events(self, direction, start, end, steps):
+        """Yield the same events as _cell_events, but only where a building run begins.
+
+        A building met again further along the road is already on the chain, so only the first
+        step of each of its runs matters.
+        """
+        if direction == "horizontal":
+            starts = self._runs.column_building_starts(end + 1, steps) + self._runs.column_building_starts(start - 1, steps)
+        else:
+            starts = self._runs.row_building_starts(start - 1, steps) + self._runs.row_building_starts(end + 1, steps)
+        buildings = defaultdict(list)
+        for step, id in starts:
+            buildings[step].append(id)
+        crossings = self._crossing_starts(direction, start, steps)
+
+        for step in sorted(buildings.keys() | crossings.keys()):
+            yield sorted(buildings.get(step, [])), crossings.get(step, [])
+
+    def walk(self, pair, direction) -> list[tuple]:
+        """Return the ordered (u, v, weight) edge chain along the road between a pair of road ends."""
+        if direction == "horizontal":
+            start = min(pair[0][1], pair[1][1])
+            end = max(pair[0][3], pair[1][3])
+            steps = self._cols
+        else:
+            start = min(pair[0][0], pair[1][0])
+            end = max(pair[0][2], pair[1][2])
+            steps = self._rows
+        width = end - start + 1
+        events = self._cell_events if self._runs is None else self._run_events
+
+        edges = []
+        used_nodes = set()
+        current_node = pair[0]
+        used_nodes.add(current_node)
+        for building_ids, crossings in events(direction, start, end, steps):
+            neighbours = [self._building_nodes[id] for id in building_ids]
+            neighbours += [self._intersection_nodes[index] for index in crossings]
+
+            for node in neighbours:
+                if node in used_nodes:
+                    continue
+                edges.append((current_node, node, width))
+                used_nodes.add(node)
+                current_node = node
+
+        edges.append((current_node, pair[1], width))
+        return edges
+
+
+_worker_road_index = None
 
-class NodeType(StrEnum):
-    BUILDING = "building"
-    WAREHOUSE = "warehouse"
-    INTERSECTION = "intersection"
-    ROAD_END = "road_end"
 
+def _init_road_worker(road_index: RoadIndex):
+    global _worker_road_index
+    _worker_road_index = road_index
+
+
+def _walk_road_in_worker(task) -> list[tuple]:
+    pair, direction = task
+    return _worker_road_index.walk(pair, direction)
 
 
 class GridGraph:
-    def __init__(self, grid: Grid):
+    def __init__(self, grid: Grid, vectorized: bool = True, workers: int = 1, executor: str = "process", tile_size: int | None = None,
+                 build: bool = True, stats: BuildStats | None = None, cache: GraphCache | None = None, run_length: bool = False):
+        if executor not in ("thread", "process"):
+            raise ValueError("Executor must be 'thread' or 'process'.")
+        if tile_size is not None and (tile_size < 1 or not vectorized):
+            raise ValueError("Tiled construction needs a positive tile size and the vectorized stages.")
+        if run_length and not vectorized:
+            raise ValueError("Run-length walks need the vectorized stages.")
         self._grid = grid
         self._matrix = grid.grid
         self._rows, self._cols = grid.height, grid.width
-        self._graph = nx.Graph()
-        self._visited = set()
-        self._orthogonal_directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        self._diagonal_directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        self._road_matrix = np.where(self._matrix == CellType.ROAD, 0, 1)
-        self.create_graph()
+        self._core = CompactGraph()
+        self._vectorized = vectorized
+        self._workers = workers
+        self._executor = executor
+        self._tile_size = tile_size
+        self._orthogonal_directions = ORTHOGONAL_DIRECTIONS
+        self._diagonal_directions = DIAGONAL_DIRECTIONS
+        self._road_matrix = np.where(self._matrix == CellType.ROAD, 0, 1) if tile_size is None else None
+        self._buildings = np.zeros(0, dtype=BUILDING_TABLE_DTYPE)
+        self._tiles = None
+        self._chains = {}
+        self._applied_edits = len(grid.edits)
+        self._stats = stats
+        self._cache = cache
+        self._router = None
+        self._run_length = run_length
+        self._runs = None
+        if build:
+            self.create_graph()
+
+    def _count(self, name: str, amount: int = 1):
+        if self._stats is not None:
+            self._stats.count(name, amount)
 
     def _is_within_bounds(self, x, y):
         return 0 <= x < self._rows and 0 <= y < self._cols
     
+    def _compute_building_table(self) -> np.ndarray:
+        """Compute bounding box, cell count and warehouse flag of every building in one pass."""
+        building_count = self._grid.next_building_id
+        if self._runs is not None:
+            return self._building_table(*self._runs.building_extents(building_count))
+        rows, cols = np.nonzero(self._matrix >= CellType.BUILDING)
+        ids = self._matrix[rows, cols]
+
+        cell_count = np.bincount(ids, minlength=building_count)
+        min_x = np.full(building_count, self._rows, dtype=np.int64)
+        min_y = np.full(building_count, self._cols, dtype=np.int64)
+        max_x = np.full(building_count, -1, dtype=np.int64)
+        max_y = np.full(building_count, -1, dtype=np.int64)
+        np.minimum.at(min_x, ids, rows)
+        np.minimum.at(min_y, ids, cols)
+        np.maximum.at(max_x, ids, rows)
+        np.maximum.at(max_y, ids, cols)
+
+        return self._building_table(cell_count, min_x, min_y, max_x, max_y)
+
+    def _building_table(self, cell_count, min_x, min_y, max_x, max_y) -> np.ndarray:
+        present = np.nonzero(cell_count > 0)[0]
+        table = np.zeros(len(present), dtype=BUILDING_TABLE_DTYPE)
+        table['id'] = present
+        table['min_x'] = min_x[present]
+        table['min_y'] = min_y[present]
+        table['max_x'] = max_x[present]
+        table['max_y'] = max_y[present]
+        table['cell_count'] = cell_count[present]
+        table['is_warehouse'] = np.isin(present, np.fromiter(self._grid.warehouses, dtype=np.int64))
+        return table
+
     def _find_building_nodes(self):
-        for id in range(1, self._grid.next_building_id):
-            x, y = np.where(self._matrix == id)
-            for i in range(len(x)):
-                min_x, min_y = np.min(x), np.min(y)
-                max_x, max_y = np.max(x), np.max(y)
-                bounding_box = (int(min_x), int(min_y), int(max_x), int(max_y))
-                type = NodeType.WAREHOUSE if id in self._grid.warehouses else NodeType.BUILDING
-                self._graph.add_node(bounding_box, type=type, id=id)
+        self._buildings = self._compute_building_table()
+        self._add_building_nodes()
+
+    def _building_keys(self) -> list[tuple]:
+        table = self._buildings
+        return list(zip(table['min_x'].tolist(), table['min_y'].tolist(), table['max_x'].tolist(), table['max_y'].tolist()))
+
+    def _add_building_nodes(self):
+        types = [NodeType.WAREHOUSE if is_warehouse else NodeType.BUILDING for is_warehouse in self._buildings['is_warehouse'].tolist()]
+        self._core.add_nodes(self._building_keys(), types, self._buildings['id'].tolist())
 
     def _check_direction_sum(self, road, directions) -> tuple[int, bool]:
         sum = 0
@@ -107,8 +326,8 @@ class GridGraph:
             bounding_box = (int(min_x), int(min_y), int(max_x), int(max_y))
             intersection_nodes.add(bounding_box)
         
-        for node in intersection_nodes:
-            self._graph.add_node(node, type=NodeType.INTERSECTION)
+        for node in sorted(intersection_nodes):
+            self._core.add_node(node, type=NodeType.INTERSECTION)
 
     def _create_end_of_road_nodes(self, end_of_road_corners):
         end_of_road_nodes = set()
@@ -162,26 +381,44 @@ class GridGraph:
             bounding_box = (int(min_x), int(min_y), int(max_x), int(max_y))
             end_of_road_nodes.add(bounding_box)
 
-        for node in end_of_road_nodes:
-            self._graph.add_node(node, type=NodeType.ROAD_END)
+        for node in sorted(end_of_road_nodes):
+            self._core.add_node(node, type=NodeType.ROAD_END)
 
-    def _find_intersections_and_end_nodes(self):
+    def _find_corners_per_cell(self):
+        """Reference mode: classify the road cells one at a time."""
         intersection_corners = []
         end_of_road_corners = []
         roads = list(zip(*np.where(self._road_matrix == 0)))
+        self._count("road_cells_scanned", len(roads))
         for road in roads:
             node_type = self._check_intersection_point_or_end(road)
             if node_type == NodeType.INTERSECTION:
                 intersection_corners.append(road)
             elif node_type == NodeType.ROAD_END:
                 end_of_road_corners.append(road)
+        self._count("intersection_corners", len(intersection_corners))
+        self._count("road_end_corners", len(end_of_road_corners))
+        return intersection_corners, end_of_road_corners
+
+    def _find_intersections_and_end_nodes(self):
+        if not self._vectorized:
+            intersection_corners, end_of_road_corners = self._find_corners_per_cell()
+            self._create_intersection_nodes(intersection_corners)
+            self._create_end_of_road_nodes(end_of_road_corners)
+            return
 
-        self._create_intersection_nodes(intersection_corners)
-        self._create_end_of_road_nodes(end_of_road_corners)
+        counts = None if self._stats is None else self._stats.counters
+        self._add_feature_nodes(*find_feature_boxes(self._road_matrix, counts))
+
+    def _add_feature_nodes(self, intersection_boxes, end_of_road_boxes):
+        # Sorted, so the node order (and the walk order through overlapping intersections) depends
+        # only on the boxes, not on the history of a set; updates can then reuse unaffected chains.
+        self._core.add_nodes(sorted(set(intersection_boxes)), NodeType.INTERSECTION)
+        self._core.add_nodes(sorted(set(end_of_road_boxes)), NodeType.ROAD_END)
 
 
     def _find_road_end_pairs(self):
-        road_end_nodes = [node for node, data in self._graph.nodes(data=True) if data['type'] == NodeType.ROAD_END]
+        road_end_nodes = self._core.keys_of_type(NodeType.ROAD_END)
         used_nodes = set()
         road_end_pairs = []
 
@@ -217,13 +454,17 @@ class GridGraph:
         return bounding_box[0] <= point[0] <= bounding_box[2] and bounding_box[1] <= point[1] <= bounding_box[3]
 
 
-    def _connect_nodes_in_road(self, pair, direction):
+    def _connect_nodes_in_road_by_scan(self, pair, direction):
+        """Reference mode: test every building and intersection at every cell of the road."""
         #TODO: Make sure every node is used.
         used_nodes = set()
-        building_nodes = [node for node, data in self._graph.nodes(data=True) if data['type'] == NodeType.BUILDING or data['type'] == NodeType.WAREHOUSE]
-        intersection_nodes = [node for node, data in self._graph.nodes(data=True) if data['type'] == NodeType.INTERSECTION]
+        building_nodes = self._core.keys_of_type(NodeType.BUILDING, NodeType.WAREHOUSE)
+        intersection_nodes = self._core.keys_of_type(NodeType.INTERSECTION)
         current_node = pair[0]
         used_nodes.add(current_node)
+        # Every free building is tested on both sides of the road and every free intersection once, at every step.
+        counting = self._stats is not None
+        bbox_tests = 0
 
         if direction == "horizontal":
             start_y = min(pair[0][1], pair[1][1])
@@ -233,27 +474,31 @@ class GridGraph:
                 top = (x, end_y + 1)
                 bottom = (x, start_y - 1)
 
+                if counting:
+                    bbox_tests += 2 * sum(building not in used_nodes for building in building_nodes)
                 for building in building_nodes:
                     if building in used_nodes:
                         continue
                     if self._check_point_in_bounding_box(top, building):
-                        self._graph.add_edge(current_node, building, weight=width)
+                        self._core.add_edge(current_node, building, weight=width)
                         used_nodes.add(building)
                         current_node = building
                     if self._check_point_in_bounding_box(bottom, building):
-                        self._graph.add_edge(current_node, building, weight=width)
+                        self._core.add_edge(current_node, building, weight=width)
                         used_nodes.add(building)
                         current_node = building
 
+                if counting:
+                    bbox_tests += sum(intersection not in used_nodes for intersection in intersection_nodes)
                 for intersection in intersection_nodes:
                     if intersection in used_nodes:
                         continue
                     if self._check_point_in_bounding_box((x, start_y), intersection):
-                        self._graph.add_edge(current_node, intersection, weight=width)
+                        self._core.add_edge(current_node, intersection, weight=width)
                         used_nodes.add(intersection)
                         current_node = intersection
             
-            self._graph.add_edge(current_node, pair[1], weight=width)
+            self._core.add_edge(current_node, pair[1], weight=width)
             
         if direction == "vertical":
             start_x = min(pair[0][0], pair[1][0])
@@ -263,71 +508,287 @@ class GridGraph:
                 left = (start_x - 1, y)
                 right = (end_x + 1, y)
 
+                if counting:
+                    bbox_tests += 2 * sum(building not in used_nodes for building in building_nodes)
                 for building in building_nodes:
                     if building in used_nodes:
                         continue
                     if self._check_point_in_bounding_box(left, building):
-                        self._graph.add_edge(current_node, building, weight=width)
+                        self._core.add_edge(current_node, building, weight=width)
                         used_nodes.add(building)
                         current_node = building
                     if self._check_point_in_bounding_box(right, building):
-                        self._graph.add_edge(current_node, building, weight=width)
+                        self._core.add_edge(current_node, building, weight=width)
                         used_nodes.add(building)
                         current_node = building
 
+                if counting:
+                    bbox_tests += sum(intersection not in used_nodes for intersection in intersection_nodes)
                 for intersection in intersection_nodes:
                     if intersection in used_nodes:
                         continue
                     if self._check_point_in_bounding_box((start_x, y), intersection):
-                        self._graph.add_edge(current_node, intersection, weight=width)
+                        self._core.add_edge(current_node, intersection, weight=width)
                         used_nodes.add(intersection)
                         current_node = intersection
             
-            self._graph.add_edge(current_node, pair[1], weight=width)
+            self._core.add_edge(current_node, pair[1], weight=width)
+
+        # Every edge but the last one reaches a node that was not used yet.
+        self._count("edges_added", len(used_nodes))
+        self._count("bbox_tests", bbox_tests)
     
+    def _build_road_index(self) -> RoadIndex:
+        building_nodes = dict(zip(self._buildings['id'].tolist(), self._building_keys()))
+        intersection_nodes = self._core.keys_of_type(NodeType.INTERSECTION)
+        return RoadIndex(self._matrix, building_nodes, intersection_nodes, self._runs)
+
+    def _walk_roads_in_pool(self, road_end_pairs) -> list[list[tuple]]:
+        """Walk the roads on a thread or process pool; results come back in the order of road_end_pairs."""
+        tasks = [(pair["pair"], pair["direction"]) for pair in road_end_pairs]
+        if self._executor == "process":
+            chunksize = max(1, len(tasks) // (4 * self._workers))
+            with ProcessPoolExecutor(self._workers, initializer=_init_road_worker, initargs=(self._road_index,)) as pool:
+                return list(pool.map(_walk_road_in_worker, tasks, chunksize=chunksize))
+        with ThreadPoolExecutor(self._workers) as pool:
+            return list(pool.map(lambda task: self._road_index.walk(*task), tasks))
+
+    def _walk_roads(self, road_end_pairs) -> list[list[tuple]]:
+        if self._stats is not None:
+            # A walk reads both sides of the road and the intersection crossings at every step.
+            self._count("roads_walked", len(road_end_pairs))
+            self._count("walk_steps", sum(self._cols if pair["direction"] == "horizontal" else self._rows for pair in road_end_pairs))
+        if self._workers <= 1 or len(road_end_pairs) < 2:
+            return [self._road_index.walk(pair["pair"], pair["direction"]) for pair in road_end_pairs]
+        return self._walk_roads_in_pool(road_end_pairs)
+
+    def _add_chains(self, road_end_pairs):
+        """Add the walked edge chains to the graph in road end pair order."""
+        for pair in road_end_pairs:
+            chain = self._chains[(pair["pair"], pair["direction"])]
+            for u, v, weight in chain:
+                self._core.add_edge(u, v, weight=weight)
+            self._count("edges_added", len(chain))
+
     def _create_edges(self):
         road_end_pairs = self._find_road_end_pairs()
-        
-        for pair in road_end_pairs:
-            self._connect_nodes_in_road(pair["pair"], pair["direction"])
+        self._count("road_end_pairs", len(road_end_pairs))
+
+        if not self._vectorized:
+            for pair in road_end_pairs:
+                self._connect_nodes_in_road_by_scan(pair["pair"], pair["direction"])
+            return
+
+        self._road_index = self._build_road_index()
+        chains = self._walk_roads(road_end_pairs)
+        self._chains = {(pair["pair"], pair["direction"]): edges for pair, edges in zip(road_end_pairs, chains)}
+        self._add_chains(road_end_pairs)
+
+    def _tile_task(self, core):
+        window, window_core = read_tile(self._matrix, core, halo=TILE_HALO)
+        return window, window_core, core[:2], (self._rows, self._cols)
+
+    def _scan_tiles(self, cores) -> list[dict]:
+        """Scan the tiles, on the pool when workers > 1, reading only a few tiles ahead of the workers."""
+        tiles = self._scan_tiles_in_pool(cores) if self._workers > 1 and len(cores) > 1 else [scan_tile(self._tile_task(core)) for core in cores]
+        if self._stats is not None:
+            self._count("tiles_scanned", len(tiles))
+            for tile in tiles:
+                self._stats.counters.update(tile['counts'])
+        return tiles
+
+    def _scan_tiles_in_pool(self, cores) -> list[dict]:
+        tiles = []
+        pool_class = ProcessPoolExecutor if self._executor == "process" else ThreadPoolExecutor
+        batch_size = 2 * self._workers
+        with pool_class(self._workers) as pool:
+            for start in range(0, len(cores), batch_size):
+                tasks = [self._tile_task(core) for core in cores[start:start + batch_size]]
+                tiles.extend(pool.map(scan_tile, tasks))
+        return tiles
+
+    def _add_nodes_from_tiles(self):
+        """Merge the buildings of the scanned tiles across the seams, group the corners of all tiles and add them as nodes."""
+        tiles = [self._tiles[origin] for origin in sorted(self._tiles)]
+        self._buildings = self._building_table(*merge_building_extents(tiles, self._grid.next_building_id, (self._rows, self._cols)))
+        self._add_building_nodes()
+        intersections = group_intersection_corners(np.concatenate([tile['intersections'] for tile in tiles]))
+        road_ends = group_end_corners(self._matrix, np.concatenate([tile['end_corners'] for tile in tiles]).tolist())
+        self._add_feature_nodes(intersections, road_ends)
+
+    def _encode_runs(self):
+        self._runs = RunLengthGrid(self._matrix)
+        self._count("runs_encoded", self._runs.run_count())
+
+    def _update_runs(self, edits):
+        """Encode again only the rows and columns that the edits touched."""
+        if self._runs is None:
+            self._encode_runs()
+            return
+        rows, columns = set(), set()
+        for kind, rect in edits:
+            if rect is not None:
+                rows.update(range(rect[1], rect[3]))
+                columns.update(range(rect[0], rect[2]))
+        self._count("runs_encoded", self._runs.update(self._matrix, sorted(rows), sorted(columns)))
+
+    def _create_nodes_tiled(self):
+        """Find every node tile by tile, then stitch buildings and features that cross the seams."""
+        cores = list(iter_tiles(self._rows, self._cols, self._tile_size))
+        with stage(self._stats, "GridGraph._scan_tiles"):
+            self._tiles = {tile['origin']: tile for tile in self._scan_tiles(cores)}
+        with stage(self._stats, "GridGraph._add_nodes_from_tiles"):
+            self._add_nodes_from_tiles()
 
-        
     def create_graph(self):
-        self._find_building_nodes()
-        self._find_intersections_and_end_nodes()
-        self._create_edges()
-
-    def get_graph(self):
-        return self._graph
+        """Build the graph, or load it from the cache when one was given and holds this grid."""
+        if self._cache is not None:
+            with stage(self._stats, "GridGraph._load_from_cache"):
+                key = grid_key(self._grid, BUILDER_VERSION)
+                entry = self._cache.load(key)
+            if entry is not None:
+                self._core, self._buildings = entry
+                return
+
+        with profiling(self._stats):
+            if self._run_length:
+                with stage(self._stats, "GridGraph._encode_runs"):
+                    self._encode_runs()
+            if self._tile_size is not None:
+                self._create_nodes_tiled()
+            else:
+                with stage(self._stats, "GridGraph._find_building_nodes"):
+                    self._find_building_nodes()
+                with stage(self._stats, "GridGraph._find_intersections_and_end_nodes"):
+                    self._find_intersections_and_end_nodes()
+            with stage(self._stats, "GridGraph._create_edges"):
+                self._create_edges()
+
+        if self._cache is not None:
+            with stage(self._stats, "GridGraph._store_in_cache"):
+                self._cache.store(key, self._core, self._buildings)
+
+    def _walk_crosses(self, pair, regions) -> bool:
+        """Check whether the cells read by a road walk (the road and both sides) overlap any region."""
+        (first, second), direction = pair["pair"], pair["direction"]
+        if direction == "horizontal":
+            low, high = min(first[1], second[1]) - 1, max(first[3], second[3]) + 1
+            return any(region[1] <= high and region[3] >= low for region in regions)
+        low, high = min(first[0], second[0]) - 1, max(first[2], second[2]) + 1
+        return any(region[0] <= high and region[2] >= low for region in regions)
+
+    def update(self):
+        """Apply the edits made to the grid since the graph was built or last updated.
+
+        Only the tiles around the edited cells are scanned again, and only the roads whose walk
+        crosses an edit or a changed node are walked again. The nodes and cached edge chains are
+        then put back together in the order a full build uses, so the graph is the same as
+        GridGraph(grid) on the edited grid.
+        """
+        edits = self._grid.edits[self._applied_edits:]
+        self._applied_edits = len(self._grid.edits)
+        if not edits:
+            return
+        # Placing a building may have widened the grid into a new array.
+        self._matrix = self._grid.grid
+        if not self._vectorized:
+            self._core = CompactGraph()
+            self._road_matrix = np.where(self._matrix == CellType.ROAD, 0, 1)
+            self.create_graph()
+            return
+        with profiling(self._stats):
+            self._apply_edits(edits)
+
+    def _apply_edits(self, edits):
+        # Edits are (start_x, start_y, end_x, end_y) in grid coordinates; regions are inclusive
+        # (min_x, min_y, max_x, max_y) boxes in matrix coordinates, grown by the tile halo: a corner
+        # record reads the cells two steps away through the inner flags of its neighbours.
+        regions = [(rect[1] - TILE_HALO, rect[0] - TILE_HALO, rect[3] + TILE_HALO - 1, rect[2] + TILE_HALO - 1)
+                   for kind, rect in edits if rect is not None]
+        self._road_matrix = None
+
+        cores = list(iter_tiles(self._rows, self._cols, self._tile_size or INCREMENTAL_TILE_SIZE))
+        if self._tiles is None:
+            self._tiles = {}
+        else:
+            cores = [core for core in cores if any(core[0] <= region[2] and core[2] > region[0] and core[1] <= region[3] and core[3] > region[1]
+                                                   for region in regions)]
+        with stage(self._stats, "GridGraph.update._scan_tiles"):
+            for tile in self._scan_tiles(cores):
+                self._tiles[tile['origin']] = tile
+
+        with stage(self._stats, "GridGraph.update._add_nodes_from_tiles"):
+            old_nodes = set(self._core.keys_of_type(*NodeType))
+            self._core = CompactGraph()
+            self._add_nodes_from_tiles()
+            regions.extend(old_nodes ^ set(self._core.keys_of_type(*NodeType)))
+
+        if self._run_length:
+            with stage(self._stats, "GridGraph.update._encode_runs"):
+                self._update_runs(edits)
+        with stage(self._stats, "GridGraph.update._create_edges"):
+            self._road_index = self._build_road_index()
+            road_end_pairs = self._find_road_end_pairs()
+            keys = [(pair["pair"], pair["direction"]) for pair in road_end_pairs]
+            stale = [pair for pair, key in zip(road_end_pairs, keys) if key not in self._chains or self._walk_crosses(pair, regions)]
+            walked = {(pair["pair"], pair["direction"]): edges for pair, edges in zip(stale, self._walk_roads(stale))}
+            self._chains = {key: walked[key] if key in walked else self._chains[key] for key in keys}
+            self._add_chains(road_end_pairs)
+
+    def get_graph(self) -> "nx.Graph":
+        """Return the networkx view of the graph, keyed by bounding boxes. It is built on the first call."""
+        return self._core.to_networkx()
+
+    def get_compact_graph(self) -> CompactGraph:
+        return self._core
+
+    def get_stats(self) -> BuildStats | None:
+        """Return the BuildStats passed to the constructor, holding the stages and counters recorded so far."""
+        return self._stats
+
+    def get_router(self) -> WarehouseRouter:
+        """Return the warehouse router of this graph. Its shortest path tree is rebuilt only after the graph changes."""
+        if self._router is None:
+            self._router = WarehouseRouter(self)
+        return self._router
+
+    def build_contraction_index(self) -> ContractionIndex:
+        """Preprocess the graph for point to point shortest path queries. See ContractionIndex.report for its build time and size."""
+        with stage(self._stats, "GridGraph.build_contraction_index"):
+            return ContractionIndex.build(self._core)
+
+    def get_building_table(self) -> np.ndarray:
+        """Return the per-building table (id, bounding box, cell count, warehouse flag) built with the nodes."""
+        return self._buildings
     
-    def output_graphviz(self):
+    def export(self, path: str, format: str):
+        """Stream the graph to path in one of export.EXPORTERS: dot, graphml, binary, json or ndjson."""
+        export_graph(self._core, path, format)
+
+    def output_graphviz(self, path: str = "grid_graph", render: bool = True):
+        """Write the DOT source to path and render it to <path>.png with dot.
+
+        With render=False only the DOT source is written, streamed with every node pinned at its
+        bounding box centre, so no layout is computed; `neato -n -Tpng` renders it later.
+        """
+        if not render:
+            write_dot(self._core, path)
+            return
+
+        from graphviz import Digraph
         dot = Digraph()
 
-        color_map = {
-            NodeType.INTERSECTION: 'dodgerblue',
-            NodeType.ROAD_END: 'green3',
-            NodeType.BUILDING: 'gold',
-            NodeType.WAREHOUSE: 'firebrick1'  
-        }
-
-        shape_map = {
-            NodeType.INTERSECTION: 'octagon',
-            NodeType.ROAD_END: 'square',
-            NodeType.BUILDING: 'house',
-            NodeType.WAREHOUSE: 'invhouse'
-        }
-
-        for node in self._graph.nodes(data=True):
+        for node in self._core.iter_nodes():
             node_id, node_data = node
-            shape = shape_map.get(node_data['type'], 'square')
-            color = color_map.get(node_data['type'], 'gray')
+            shape = SHAPE_MAP.get(node_data['type'], 'square')
+            color = COLOR_MAP.get(node_data['type'], 'gray')
             label = f"{node_data['type']}({node_data['id']})\n{node_id}" if node_data['type'] in [NodeType.BUILDING, NodeType.WAREHOUSE] else f"{node_data['type']}\n{node_id}"
             dot.node(str(node_id), label=label, shape=shape, style='filled', fillcolor=color)
-        for edge in self._graph.edges(data=True):
-            weight = edge[2].get('weight', 1)
+        for edge in self._core.iter_edges():
+            weight = edge[2]
             dot.edge(str(edge[0]), str(edge[1]), label=str(weight), penwidth=str(weight), arrowhead='none')
 
-        dot.render('grid_graph', format='png')
+        dot.render(path, format='png')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import cProfile
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+
+class BuildStats:
+    """Opt-in instrumentation for Grid generation and GridGraph builds.
+
+    Every stage records wall time, CPU time and, with trace_memory, the peak traced allocation
+    above the memory in use when it started. Counters are kept by name. callback(stage, record) is
+    called after each stage. With profile set, every profiled run (the Grid generation and the
+    GridGraph build sharing one BuildStats, say) is added to one profile written to that path: a
+    cProfile dump with profile_format="pstats", or one "frame;frame;frame microseconds" line per call
+    stack with profile_format="collapsed", which flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, trace_memory: bool = False, callback=None, profile: str | None = None, profile_format: str = "pstats"):
+        if profile_format not in ("pstats", "collapsed"):
+            raise ValueError("Profile format must be 'pstats' or 'collapsed'.")
+        self.stages = {}
+        self.counters = Counter()
+        self._trace_memory = trace_memory
+        self._callback = callback
+        self._profile = profile
+        self._profile_format = profile_format
+        self._profiled = None
+
+    @contextmanager
+    def stage(self, name: str):
+        started_tracing = self._trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {"wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+            if self._trace_memory:
+                record["peak_bytes"] = tracemalloc.get_traced_memory()[1] - baseline
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages[name] = record
+            if self._callback is not None:
+                self._callback(name, record)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += int(amount)
+
+    @contextmanager
+    def profiling(self):
+        """Profile the enclosed code, adding it to the profile at the configured path, if any."""
+        if self._profile is None:
+            yield
+            return
+        profiler = cProfile.Profile() if self._profile_format == "pstats" else _StackProfiler()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if self._profiled is None:
+                self._profiled = pstats.Stats(profiler) if self._profile_format == "pstats" else profiler
+            else:
+                self._profiled.add(profiler)
+            self._profiled.dump_stats(self._profile)
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<40} {'wall ms':>10} {'cpu ms':>10} {'peak MiB':>10}"]
+        for name, record in self.stages.items():
+            peak = f"{record['peak_bytes'] / 2 ** 20:10.2f}" if "peak_bytes" in record else f"{'-':>10}"
+            lines.append(f"{name:<40} {record['wall'] * 1000:10.3f} {record['cpu'] * 1000:10.3f} {peak}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<40} {value:>10}")
+        return "\n".join(lines)
+
+
+def stage(stats: BuildStats | None, name: str):
+    """Time a stage on stats, or do nothing when instrumentation is off."""
+    return nullcontext() if stats is None else stats.stage(name)
+
+
+def profiling(stats: BuildStats | None):
+    return nullcontext() if stats is None else stats.profiling()
+
+
+class _StackProfiler:
+    """Deterministic profiler that accumulates self time per full call stack."""
+
+    def __init__(self):
+        self._stack = []
+        self._times = Counter()
+        self._last = 0.0
+
+    def _frame_name(self, frame, event, arg) -> str:
+        if event.startswith("c_"):
+            return f"{getattr(arg, '__module__', None) or 'builtins'}.{getattr(arg, '__qualname__', arg)}"
+        code = frame.f_code
+        return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_qualname if hasattr(code, 'co_qualname') else code.co_name}"
+
+    def _charge(self):
+        now = time.perf_counter()
+        if self._stack:
+            self._times[";".join(self._stack)] += now - self._last
+        self._last = now
+
+    def _trace(self, frame, event, arg):
+        if event in ("call", "c_call"):
+            self._charge()
+            self._stack.append(self._frame_name(frame, event, arg))
+        elif event in ("return", "c_return", "c_exception") and self._stack:
+            self._charge()
+            self._stack.pop()
+
+    def enable(self):
+        self._last = time.perf_counter()
+        sys.setprofile(self._trace)
+
+    def disable(self):
+        sys.setprofile(None)
+        self._charge()
+
+    def add(self, other: "_StackProfiler"):
+        self._times.update(other._times)
+
+    def dump_stats(self, path: str):
+        with open(path, "w") as file:
+            for stack, seconds in sorted(self._times.items()):
+                microseconds = round(seconds * 1e6)
+                if microseconds > 0:
+                    file.write(f"{stack} {microseconds}\n")
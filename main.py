@@ -1,8 +1,10 @@
-from grid_graph import GridGraph
-from grid import Grid
+import random
+import sys
 
+import cli
 
-import sys
+# Draws one new random grid and its graph, as `cli.py render --size <width> <height> --graph` does.
+# The seed is part of the output names, so a grid worth keeping can be generated again with cli.py.
 
 if len(sys.argv) != 3:
     print("Usage: python3 main.py <width> <height>")
@@ -15,9 +17,5 @@ except ValueError:
     print("Width and height must be integers.")
     sys.exit(1)
 
-grid = Grid(width, height)
-grid.visualize_grid()
-graph = GridGraph(grid)
-graph.output_graphviz()
-
-
+seed = random.randrange(2 ** 32)
+sys.exit(cli.main(["render", "--size", str(width), str(height), "--seeds", str(seed), "--pixels-per-cell", "32", "--graph"]))
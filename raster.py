@@ -0,0 +1,143 @@
+import math
+import os
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from grid import Grid, CellType
+from tiling import iter_tiles
+
+WHITE = (255, 255, 255)  # Empty (-1)
+BLACK = (0, 0, 0)        # Road (0)
+BLUE = (0, 0, 255)       # Building (>= 1)
+RED = (255, 0, 0)        # Warehouse
+
+# Cells are read in bands of rows of about this many cells, so memory-mapped grids are never loaded whole.
+BAND_CELLS = 1 << 22
+
+# Overview classes, in the order they win when a block of cells becomes one pixel.
+OVERVIEW_EMPTY, OVERVIEW_BUILDING, OVERVIEW_WAREHOUSE, OVERVIEW_ROAD = range(4)
+OVERVIEW_PALETTE = np.array([WHITE, BLUE, RED, BLACK], dtype=np.uint8)
+
+
+def _bands(rows: int, cols: int, multiple: int = 1):
+    """Yield (start, end) row ranges of about BAND_CELLS cells, aligned to multiple."""
+    step = max(BAND_CELLS // max(cols, 1) // multiple, 1) * multiple
+    for start in range(0, rows, step):
+        yield start, min(start + step, rows)
+
+
+def _value_table(grid: Grid, empty, road, building, warehouse) -> np.ndarray:
+    """Return a lookup table indexed by cell value + 1."""
+    size = max(grid.next_building_id, max(grid.warehouses, default=0) + 1) + 1
+    table = np.empty((size,) + np.shape(building), dtype=np.uint8)
+    table[0] = empty
+    table[1] = road
+    table[2:] = building
+    table[np.fromiter(grid.warehouses, dtype=np.int64) + 1] = warehouse
+    return table
+
+
+def color_table(grid: Grid) -> np.ndarray:
+    """Return the (values, 3) RGB lookup table of a grid: EMPTY, ROAD, then one colour per building id."""
+    return _value_table(grid, WHITE, BLACK, BLUE, RED)
+
+
+def building_labels(grid: Grid) -> dict:
+    """Return {id: (centroid_x, centroid_y, width)} for every building, in cells, reading the grid band by band."""
+    size = grid.next_building_id
+    count = np.zeros(size, dtype=np.int64)
+    sum_x = np.zeros(size, dtype=np.float64)
+    sum_y = np.zeros(size, dtype=np.float64)
+    min_x = np.full(size, grid.width, dtype=np.int64)
+    max_x = np.full(size, -1, dtype=np.int64)
+    for start, end in _bands(grid.height, grid.width):
+        y, x = np.nonzero(grid.grid[start:end] >= CellType.BUILDING)
+        ids = grid.grid[start:end][y, x].astype(np.int64)
+        count += np.bincount(ids, minlength=size)
+        sum_x += np.bincount(ids, weights=x, minlength=size)
+        sum_y += np.bincount(ids, weights=y + start, minlength=size)
+        np.minimum.at(min_x, ids, x)
+        np.maximum.at(max_x, ids, x)
+
+    present = np.nonzero(count)[0]
+    centroid_x = sum_x[present] / count[present]
+    centroid_y = sum_y[present] / count[present]
+    width = max_x[present] - min_x[present] + 1
+    return dict(zip(present.tolist(), zip(centroid_x.tolist(), centroid_y.tolist(), width.tolist())))
+
+
+def _draw_labels(image: Image.Image, labels: dict, region, pixels_per_cell: int):
+    """Write every building id whose centroid lies in the region, centred on it, if it fits the building's width."""
+    start_x, start_y, end_x, end_y = region
+    font = ImageFont.load_default(size=max(pixels_per_cell // 2, 6))
+    draw = ImageDraw.Draw(image)
+    for id, (x, y, width) in labels.items():
+        if not (start_x <= x + 0.5 < end_x and start_y <= y + 0.5 < end_y):
+            continue
+        text = str(id)
+        if draw.textlength(text, font=font) > width * pixels_per_cell:
+            continue
+        position = ((x - start_x + 0.5) * pixels_per_cell, (y - start_y + 0.5) * pixels_per_cell)
+        draw.text(position, text, fill=WHITE, font=font, anchor="mm")
+
+
+def render_region(grid: Grid, region=None, pixels_per_cell: int = 8, labels: dict | None = None, table: np.ndarray | None = None) -> Image.Image:
+    """Render the cells of region (start_x, start_y, end_x, end_y), the whole grid by default.
+
+    labels is the output of building_labels; the ids are drawn when it is given.
+    """
+    if pixels_per_cell < 1:
+        raise ValueError("Pixels per cell must be at least 1.")
+    start_x, start_y, end_x, end_y = region or (0, 0, grid.width, grid.height)
+    table = color_table(grid) if table is None else table
+    pixels = np.empty((end_y - start_y, end_x - start_x, 3), dtype=np.uint8)
+    for start, end in _bands(end_y - start_y, end_x - start_x):
+        pixels[start:end] = table[grid.grid[start_y + start:start_y + end, start_x:end_x].astype(np.intp) + 1]
+
+    image = Image.fromarray(pixels)
+    if pixels_per_cell > 1:
+        image = image.resize((image.width * pixels_per_cell, image.height * pixels_per_cell), Image.Resampling.NEAREST)
+    if labels is not None:
+        _draw_labels(image, labels, (start_x, start_y, end_x, end_y), pixels_per_cell)
+    return image
+
+
+def save_png(grid: Grid, path: str, pixels_per_cell: int = 8, labels: bool = False):
+    """Render the whole grid to one PNG file."""
+    render_region(grid, pixels_per_cell=pixels_per_cell, labels=building_labels(grid) if labels else None).save(path)
+
+
+def save_tiles(grid: Grid, directory: str, tile_size: int = 512, pixels_per_cell: int = 8, labels: bool = False) -> list[str]:
+    """Render the grid as tile_size x tile_size cell PNG tiles named tile_<row>_<column>.png.
+
+    Each tile only reads its own cells, and each label is drawn on the tile holding its building's centroid.
+    """
+    os.makedirs(directory, exist_ok=True)
+    table = color_table(grid)
+    label_table = building_labels(grid) if labels else None
+    paths = []
+    for start_y, start_x, end_y, end_x in iter_tiles(grid.height, grid.width, tile_size):
+        path = os.path.join(directory, f"tile_{start_y // tile_size}_{start_x // tile_size}.png")
+        render_region(grid, (start_x, start_y, end_x, end_y), pixels_per_cell, label_table, table).save(path)
+        paths.append(path)
+    return paths
+
+
+def render_overview(grid: Grid, max_size: int = 2048) -> Image.Image:
+    """Downsample the grid to at most max_size pixels per side.
+
+    Every block of cells becomes one pixel showing the strongest class in it (road, then warehouse,
+    then building), so thin roads stay visible however far the grid is reduced.
+    """
+    factor = max(math.ceil(max(grid.width, grid.height) / max_size), 1)
+    table = _value_table(grid, OVERVIEW_EMPTY, OVERVIEW_ROAD, OVERVIEW_BUILDING, OVERVIEW_WAREHOUSE)
+    width, height = math.ceil(grid.width / factor), math.ceil(grid.height / factor)
+    classes = np.empty((height, width), dtype=np.uint8)
+    for start, end in _bands(grid.height, grid.width, factor):
+        band = np.full((math.ceil((end - start) / factor) * factor, width * factor), OVERVIEW_EMPTY, dtype=np.uint8)
+        band[:end - start, :grid.width] = table[grid.grid[start:end].astype(np.intp) + 1]
+        classes[start // factor:start // factor + len(band) // factor] = band.reshape(len(band) // factor, factor, width, factor).max(axis=(1, 3))
+    return Image.fromarray(OVERVIEW_PALETTE[classes])
+
+
+def save_overview(grid: Grid, path: str, max_size: int = 2048):
+    render_overview(grid, max_size).save(path)
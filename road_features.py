@@ -0,0 +1,216 @@
+import numpy as np
+from collections import defaultdict
+
+ORTHOGONAL_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+DIAGONAL_DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def direction_sums(road_matrix: np.ndarray, directions) -> tuple[np.ndarray, np.ndarray]:
+    """Sum the neighbours of every cell in the given directions.
+
+    Returns the sums and a mask of the cells with at least one of those neighbours off the grid,
+    the whole-grid equivalent of GridGraph._check_direction_sum.
+    """
+    rows, cols = road_matrix.shape
+    padded = np.pad(road_matrix.astype(np.int8, copy=False), 1, constant_values=0)
+    inside = np.pad(np.ones((rows, cols), dtype=bool), 1, constant_values=False)
+
+    sums = np.zeros((rows, cols), dtype=np.int8)
+    on_edge = np.zeros((rows, cols), dtype=bool)
+    for dx, dy in directions:
+        window = (slice(1 + dx, 1 + dx + rows), slice(1 + dy, 1 + dy + cols))
+        sums += padded[window]
+        on_edge |= ~inside[window]
+    return sums, on_edge
+
+
+def classify_road_cells(road_matrix: np.ndarray):
+    """Return the intersection corner, road end corner and inner masks.
+
+    Inner cells have roads (or the grid edge) on all eight sides, the test of
+    GridGraph._check_if_intersection_edge; they decide which intersection corners belong together.
+    """
+    is_road = road_matrix == 0
+    ort_sum, ort_on_edge = direction_sums(road_matrix, ORTHOGONAL_DIRECTIONS)
+    diag_sum, diag_on_edge = direction_sums(road_matrix, DIAGONAL_DIRECTIONS)
+
+    end_corners = is_road & ort_on_edge & diag_on_edge & (ort_sum > 0) & (diag_sum > 0)
+    intersection_corners = is_road & ~end_corners & (ort_sum == 0) & (diag_sum != 0)
+    inner = (ort_sum == 0) & (diag_sum == 0)
+    return intersection_corners, end_corners, inner
+
+
+def find_corner_masks(road_matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Classify every road cell at once.
+
+    road_matrix holds 0 for roads and 1 for everything else. Returns boolean masks of the
+    intersection corners and the road end corners.
+    """
+    intersection_corners, end_corners, _ = classify_road_cells(road_matrix)
+    return intersection_corners, end_corners
+
+
+def intersection_corner_records(intersection_corners: np.ndarray, inner: np.ndarray, core=None, origin=(0, 0)) -> np.ndarray:
+    """Return one (x, y, right_inner, below_inner) row per intersection corner, in row-major order.
+
+    right_inner and below_inner tell whether the cells at (x, y + 1) and (x + 1, y) are inner, all
+    that group_intersection_corners needs to know about the grid. The masks may cover a window
+    around core (start_x, start_y, end_x, end_y); only the corners inside it are kept, moved to
+    the global origin of the core.
+    """
+    rows, cols = inner.shape
+    start_x, start_y, end_x, end_y = core if core is not None else (0, 0, rows, cols)
+    x, y = np.nonzero(intersection_corners[start_x:end_x, start_y:end_y])
+    x, y = x + start_x, y + start_y
+    right = np.zeros(len(x), dtype=np.int64)
+    below = np.zeros(len(x), dtype=np.int64)
+    has_right, has_below = y + 1 < cols, x + 1 < rows
+    right[has_right] = inner[x[has_right], y[has_right] + 1]
+    below[has_below] = inner[x[has_below] + 1, y[has_below]]
+    return np.stack((x - start_x + origin[0], y - start_y + origin[1], right, below), axis=1)
+
+
+def group_intersection_corners(records: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """Group intersection corners into bounding boxes the way GridGraph._create_intersection_nodes does.
+
+    There every corner not taken yet starts a group and takes every other corner of its row (or
+    column) that is next to it or whose in-between cell, one step past the lower of the two, is
+    inner, taken or not. For a corner c and a corner o after it in the row that cell is the one
+    right of c, so either all of them join or only a neighbour; for o before c it is the one right
+    of o, so the first such o bounds the group. Only the corners after c can still start a group,
+    so per row and column it is enough to remember from where on all of them are taken.
+    """
+    records = records[np.lexsort((records[:, 1], records[:, 0]))] if len(records) else records
+    xs, ys, right, below = (records[:, axis].tolist() for axis in range(4))
+    by_row, by_column = defaultdict(list), defaultdict(list)
+    for index in range(len(xs)):
+        by_row[xs[index]].append(index)
+        by_column[ys[index]].append(index)
+    row_position, column_position = {}, {}
+    first_right, first_below = {}, {}
+    for x, members in by_row.items():
+        for position, index in enumerate(members):
+            row_position[index] = position
+        first_right[x] = next((ys[index] for index in members if right[index]), None)
+    for y, members in by_column.items():
+        for position, index in enumerate(members):
+            column_position[index] = position
+        first_below[y] = next((xs[index] for index in members if below[index]), None)
+
+    taken = set()
+    row_taken_from, column_taken_from = {}, {}
+    boxes = []
+    for index in range(len(xs)):
+        x, y = xs[index], ys[index]
+        row, column = by_row[x], by_column[y]
+        at_row, at_column = row_position[index], column_position[index]
+        if index in taken or at_row >= row_taken_from.get(x, len(row)) or at_column >= column_taken_from.get(y, len(column)):
+            continue
+
+        min_y = max_y = y
+        if first_right[x] is not None and first_right[x] < y:
+            min_y = first_right[x]
+        if at_row > 0 and ys[row[at_row - 1]] == y - 1:
+            min_y = min(min_y, y - 1)
+        if at_row + 1 < len(row):
+            if right[index]:
+                max_y = ys[row[-1]]
+                row_taken_from[x] = min(row_taken_from.get(x, len(row)), at_row + 1)
+            elif ys[row[at_row + 1]] == y + 1:
+                max_y = y + 1
+                taken.add(row[at_row + 1])
+
+        min_x = max_x = x
+        if first_below[y] is not None and first_below[y] < x:
+            min_x = first_below[y]
+        if at_column > 0 and xs[column[at_column - 1]] == x - 1:
+            min_x = min(min_x, x - 1)
+        if at_column + 1 < len(column):
+            if below[index]:
+                max_x = xs[column[-1]]
+                column_taken_from[y] = min(column_taken_from.get(y, len(column)), at_column + 1)
+            elif xs[column[at_column + 1]] == x + 1:
+                max_x = x + 1
+                taken.add(column[at_column + 1])
+        boxes.append((min_x, min_y, max_x, max_y))
+    return boxes
+
+
+def _joining_line(matrix: np.ndarray, axis: int, index: int) -> np.ndarray:
+    """Return which cells of row index (axis 0) or column index (axis 1) can lie between two joined road end corners.
+
+    Those are the road cells on the grid edge or with roads on all four sides. matrix is any grid
+    with 0 for the road cells; only the line and its two neighbours are read.
+    """
+    size = matrix.shape[axis]
+    low = max(index - 1, 0)
+    lines = (slice(low, min(index + 2, size)), slice(None)) if axis == 0 else (slice(None), slice(low, min(index + 2, size)))
+    window = np.asarray(matrix[lines]) != 0
+    ort_sum, ort_on_edge = direction_sums(window, ORTHOGONAL_DIRECTIONS)
+    # The window is cut at the grid edge only, so on_edge of the middle line means the grid edge.
+    line = (index - low, slice(None)) if axis == 0 else (slice(None), index - low)
+    return ~window[line] & (ort_on_edge[line] | (ort_sum[line] == 0))
+
+
+def group_end_corners(matrix: np.ndarray, corners) -> list[tuple[int, int, int, int]]:
+    """Group road end corners into bounding boxes the way GridGraph._create_end_of_road_nodes does.
+
+    There every corner not taken yet starts a group and takes every free corner of its row or
+    column with only joining cells (see _joining_line) from one to the other. The joining cells of
+    each line holding a corner are split into runs, so a pair is joined when both are in one run.
+    """
+    corners = sorted((int(x), int(y)) for x, y in corners)
+    by_row, by_column = defaultdict(list), defaultdict(list)
+    for corner in corners:
+        by_row[corner[0]].append(corner)
+        by_column[corner[1]].append(corner)
+
+    run_of = {}
+    for axis, lines in ((0, by_row), (1, by_column)):
+        for index, members in lines.items():
+            runs = np.cumsum(~_joining_line(matrix, axis, index))
+            for corner in members:
+                # Each blocked cell bumps the count, so two joining cells share a value when nothing blocks them.
+                run_of[axis, corner] = int(runs[corner[1 - axis]])
+
+    taken = set()
+    boxes = []
+    for corner in corners:
+        if corner in taken:
+            continue
+        taken.add(corner)
+        group = [corner]
+        for axis, line in ((0, by_row[corner[0]]), (1, by_column[corner[1]])):
+            for other in line:
+                if other not in taken and run_of[axis, other] == run_of[axis, corner]:
+                    taken.add(other)
+                    group.append(other)
+        x = [member[0] for member in group]
+        y = [member[1] for member in group]
+        boxes.append((min(x), min(y), max(x), max(y)))
+    return boxes
+
+
+def count_road_cells(road_matrix: np.ndarray, intersection_corners: np.ndarray, end_corners: np.ndarray) -> dict:
+    """Return the instrumentation counters of one classification pass."""
+    return {
+        'road_cells_scanned': int(np.count_nonzero(road_matrix == 0)),
+        'intersection_corners': int(np.count_nonzero(intersection_corners)),
+        'road_end_corners': int(np.count_nonzero(end_corners)),
+    }
+
+
+def find_feature_boxes(road_matrix: np.ndarray, counts: dict | None = None) -> tuple[list, list]:
+    """Group the corners into intersection and road end bounding boxes.
+
+    Both groupings follow the per-cell reference exactly, see group_intersection_corners and
+    group_end_corners. When counts is given, the counters of count_road_cells are added to it.
+    """
+    intersection_corners, end_corners, inner = classify_road_cells(road_matrix)
+    if counts is not None:
+        for name, value in count_road_cells(road_matrix, intersection_corners, end_corners).items():
+            counts[name] = counts.get(name, 0) + value
+
+    intersection_boxes = group_intersection_corners(intersection_corner_records(intersection_corners, inner))
+    end_boxes = group_end_corners(road_matrix, zip(*np.nonzero(end_corners)))
+    return intersection_boxes, end_boxes
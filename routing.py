@@ -0,0 +1,114 @@
+import heapq
+import numpy as np
+from compact_graph import CompactGraph, NodeType
+
+
+class ShortestPathTree:
+    """Shortest path forest grown from several sources at once.
+
+    For every node: distance to the nearest source (inf when unreachable), that source's node id
+    and the previous node on the path towards it (-1 for the sources and unreachable nodes).
+    """
+
+    def __init__(self, distance: np.ndarray, source: np.ndarray, parent: np.ndarray):
+        self.distance = distance
+        self.source = source
+        self.parent = parent
+
+
+def multi_source_dijkstra(graph: CompactGraph, sources) -> ShortestPathTree:
+    """Run Dijkstra from every source at once over the CSR arrays of a graph.
+
+    Ties between sources at the same distance go to the lowest source id, so the tree does not
+    depend on the order the heap pops equal entries.
+    """
+    graph.freeze()
+    count = len(graph)
+    indptr, indices, weights = graph.indptr.tolist(), graph.indices.tolist(), graph.weights.tolist()
+    distance = [float('inf')] * count
+    source = [-1] * count
+    parent = [-1] * count
+    done = [False] * count
+
+    heap = []
+    for node in sorted(int(node) for node in sources):
+        distance[node], source[node] = 0, node
+        heap.append((0, node, node))
+    heapq.heapify(heap)
+
+    while heap:
+        node_distance, root, node = heapq.heappop(heap)
+        if done[node] or root != source[node]:
+            continue
+        done[node] = True
+        for edge in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[edge]
+            if done[neighbour]:
+                continue
+            candidate = node_distance + weights[edge]
+            if candidate < distance[neighbour] or (candidate == distance[neighbour] and root < source[neighbour]):
+                distance[neighbour], source[neighbour], parent[neighbour] = candidate, root, node
+                heapq.heappush(heap, (candidate, root, neighbour))
+
+    return ShortestPathTree(np.array(distance, dtype=np.float64), np.array(source, dtype=np.int64), np.array(parent, dtype=np.int64))
+
+
+class WarehouseRouter:
+    """Answers which warehouse serves a building, how far it is along the roads and by which path.
+
+    The shortest path tree from every warehouse is built on the first query and kept until the
+    graph changes: GridGraph.update() replaces the compact graph, and any other change bumps its
+    version. Queries take building ids, one or an array of them.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._core = None
+        self._version = None
+        self._tree = None
+
+    def invalidate(self):
+        self._tree = None
+
+    def tree(self) -> ShortestPathTree:
+        core = self._graph.get_compact_graph()
+        if self._tree is None or core is not self._core or core.version != self._version:
+            core.freeze()
+            self._core, self._version = core, core.version
+            self._tree = multi_source_dijkstra(core, core.nodes_of_type(NodeType.WAREHOUSE))
+        return self._tree
+
+    def _nodes(self, buildings) -> np.ndarray:
+        self.tree()
+        return self._core.building_nodes(buildings)
+
+    def nearest_warehouse(self, buildings) -> np.ndarray:
+        """Return the building id of the nearest warehouse of each building, or -1 if none can be reached."""
+        source = self.tree().source[self._nodes(buildings)]
+        return np.where(source >= 0, self._core.building_ids[source], -1)
+
+    def distance(self, buildings) -> np.ndarray:
+        """Return the road distance from each building to its nearest warehouse, inf if none can be reached."""
+        return self.tree().distance[self._nodes(buildings)]
+
+    def paths(self, buildings) -> list[list[tuple]]:
+        """Return the node keys from each building to its nearest warehouse; empty when none can be reached.
+
+        All paths are followed together, one parent lookup per step for the whole batch.
+        """
+        tree = self.tree()
+        nodes = np.atleast_1d(self._nodes(buildings))
+        # parent[-1] is -1, so finished paths keep pointing past the end.
+        parent = np.append(tree.parent, -1)
+        steps = [nodes]
+        while (steps[-1] >= 0).any():
+            steps.append(parent[steps[-1]])
+        steps = np.stack(steps, axis=1).tolist()
+
+        paths = []
+        for node, step in zip(nodes.tolist(), steps):
+            paths.append([self._core.node_key(id) for id in step[:step.index(-1)]] if tree.source[node] >= 0 else [])
+        return paths
+
+    def path(self, building: int) -> list[tuple]:
+        return self.paths([building])[0]
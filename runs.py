@@ -0,0 +1,131 @@
+import numpy as np
+from grid import CellType
+
+# Matrices are encoded in bands of rows of about this many cells, so memory-mapped grids are never loaded whole.
+ENCODE_BAND_CELLS = 1 << 22
+
+
+def _encode_lines(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run-length encode every row of matrix: (line pointers, run starts, run values) in CSR form."""
+    rows, cols = matrix.shape
+    counts, starts, values = [], [], []
+    band = max(ENCODE_BAND_CELLS // max(cols, 1), 1)
+    for first in range(0, rows, band):
+        lines = np.asarray(matrix[first:first + band])
+        change = np.ones(lines.shape, dtype=bool)
+        change[:, 1:] = lines[:, 1:] != lines[:, :-1]
+        row, column = np.nonzero(change)
+        counts.append(np.bincount(row, minlength=len(lines)))
+        starts.append(column)
+        values.append(lines[row, column])
+    pointers = np.zeros(rows + 1, dtype=np.int64)
+    if rows:
+        np.cumsum(np.concatenate(counts), out=pointers[1:])
+    return (pointers, np.concatenate(starts).astype(np.int64) if starts else np.zeros(0, dtype=np.int64),
+            np.concatenate(values).astype(np.int64) if values else np.zeros(0, dtype=np.int64))
+
+
+def _splice_lines(encoded, lines: np.ndarray, replacement) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Replace the runs of the given sorted lines of a CSR encoding by those of replacement, encoded from just these lines."""
+    pointers, starts, values = encoded
+    new_pointers, new_starts, new_values = replacement
+    counts = np.diff(pointers)
+    dirty = np.zeros(len(counts), dtype=bool)
+    dirty[lines] = True
+    keep = ~np.repeat(dirty, counts)
+    counts[lines] = np.diff(new_pointers)
+
+    spliced = np.zeros(len(pointers), dtype=np.int64)
+    np.cumsum(counts, out=spliced[1:])
+    # The runs of each line stay contiguous and in line order, so the new runs fill exactly the slots of the dirty lines.
+    slots = np.repeat(dirty, counts)
+    spliced_starts, spliced_values = np.empty(spliced[-1], dtype=np.int64), np.empty(spliced[-1], dtype=np.int64)
+    spliced_starts[~slots], spliced_values[~slots] = starts[keep], values[keep]
+    spliced_starts[slots], spliced_values[slots] = new_starts, new_values
+    return spliced, spliced_starts, spliced_values
+
+
+def group_strips(full: np.ndarray) -> list[tuple[int, int]]:
+    """Group the indices of the full-road lines into (start, width) strips of consecutive lines."""
+    lines = np.nonzero(full)[0]
+    if len(lines) == 0:
+        return []
+    breaks = np.nonzero(np.diff(lines) > 1)[0] + 1
+    firsts, lasts = lines[np.r_[0, breaks]], lines[np.r_[breaks - 1, len(lines) - 1]]
+    return list(zip(firsts.tolist(), (lasts - firsts + 1).tolist()))
+
+
+class RunLengthGrid:
+    """Runs of equal cells along every row and every column of a grid matrix.
+
+    Rows and columns are each kept in CSR form: the runs of line i are starts[pointers[i]:pointers[i + 1]]
+    with their cell values, and each run ends where the next one starts or at the end of the line.
+    Coordinates are matrix (row, column), like the node bounding boxes of GridGraph.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.shape = matrix.shape
+        self.row_pointers, self.row_starts, self.row_values = _encode_lines(matrix)
+        self.column_pointers, self.column_starts, self.column_values = _encode_lines(matrix.T)
+
+    def update(self, matrix: np.ndarray, rows, columns) -> int:
+        """Encode the given rows and columns of matrix again, keeping the runs of every other line.
+
+        matrix must have the shape that was encoded. Returns the number of runs encoded.
+        """
+        rows, columns = np.unique(np.asarray(rows, dtype=np.int64)), np.unique(np.asarray(columns, dtype=np.int64))
+        self.row_pointers, self.row_starts, self.row_values = _splice_lines(
+            (self.row_pointers, self.row_starts, self.row_values), rows, _encode_lines(np.asarray(matrix)[rows]))
+        self.column_pointers, self.column_starts, self.column_values = _splice_lines(
+            (self.column_pointers, self.column_starts, self.column_values), columns, _encode_lines(np.asarray(matrix)[:, columns].T))
+        return int(self.row_pointers[rows + 1].sum() - self.row_pointers[rows].sum()
+                   + self.column_pointers[columns + 1].sum() - self.column_pointers[columns].sum())
+
+    def run_count(self) -> int:
+        return len(self.row_starts) + len(self.column_starts)
+
+    def _line(self, pointers, starts, values, length: int, index: int):
+        if not 0 <= index < len(pointers) - 1:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        run_starts = starts[pointers[index]:pointers[index + 1]]
+        return run_starts, np.append(run_starts[1:], length), values[pointers[index]:pointers[index + 1]]
+
+    def row_runs(self, row: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (starts, exclusive ends, values) of the runs of a row; nothing for rows off the grid."""
+        return self._line(self.row_pointers, self.row_starts, self.row_values, self.shape[1], row)
+
+    def column_runs(self, column: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self._line(self.column_pointers, self.column_starts, self.column_values, self.shape[0], column)
+
+    def building_extents(self, building_count: int) -> tuple[np.ndarray, ...]:
+        """Return per-id (cell_count, min_x, min_y, max_x, max_y) arrays, from the row runs alone."""
+        rows, cols = self.shape
+        row = np.repeat(np.arange(rows), np.diff(self.row_pointers))
+        ends = np.append(self.row_starts[1:], cols)
+        ends[self.row_pointers[1:][np.diff(self.row_pointers) > 0] - 1] = cols
+        buildings = self.row_values >= CellType.BUILDING
+        ids, row, starts, ends = self.row_values[buildings], row[buildings], self.row_starts[buildings], ends[buildings]
+
+        cell_count = np.bincount(ids, weights=ends - starts, minlength=building_count).astype(np.int64)
+        min_x = np.full(building_count, rows, dtype=np.int64)
+        min_y = np.full(building_count, cols, dtype=np.int64)
+        max_x = np.full(building_count, -1, dtype=np.int64)
+        max_y = np.full(building_count, -1, dtype=np.int64)
+        np.minimum.at(min_x, ids, row)
+        np.minimum.at(min_y, ids, starts)
+        np.maximum.at(max_x, ids, row)
+        np.maximum.at(max_y, ids, ends - 1)
+        return cell_count, min_x, min_y, max_x, max_y
+
+    def _building_starts(self, runs, steps: int) -> list[tuple[int, int]]:
+        starts, _, values = runs
+        chosen = (values >= CellType.BUILDING) & (starts < steps)
+        return list(zip(starts[chosen].tolist(), values[chosen].tolist()))
+
+    def row_building_starts(self, row: int, steps: int) -> list[tuple[int, int]]:
+        """Return (column, building id) where a building run starts on a row, for the columns below steps."""
+        return self._building_starts(self.row_runs(row), steps)
+
+    def column_building_starts(self, column: int, steps: int) -> list[tuple[int, int]]:
+        return self._building_starts(self.column_runs(column), steps)
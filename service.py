@@ -0,0 +1,356 @@
+import asyncio
+import hashlib
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlencode, urlsplit
+import numpy as np
+
+CONTENT_TYPES = {
+    "dot": "text/vnd.graphviz",
+    "graphml": "application/xml",
+    "binary": "application/octet-stream",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+GENERATOR_OPTIONS = {"width", "height", "seed", "max_road_width", "min_building_size", "max_building_size"}
+# Latency percentiles are taken over this many of the most recent requests.
+LATENCY_WINDOW = 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+_cache = None
+
+
+def _init_worker(cache_directory: str | None):
+    # Pay the imports once per worker rather than once per build.
+    global _cache
+    import grid_graph  # noqa: F401
+    if cache_directory is not None:
+        from graph_cache import GraphCache
+        _cache = GraphCache(cache_directory)
+
+
+def _build_in_worker(task) -> tuple[bytes, float]:
+    """Build and export one graph; returns the exported bytes and the build time."""
+    from grid import Grid
+    from grid_graph import GridGraph
+
+    kind, payload, warehouses, format = task
+    start = time.perf_counter()
+    if kind == "generate":
+        grid = Grid(**payload)
+    else:
+        matrix = np.load(io.BytesIO(payload), allow_pickle=False)
+        if matrix.ndim != 2 or not np.issubdtype(matrix.dtype, np.integer):
+            raise ValueError("The grid must be a 2D integer array.")
+        grid = Grid.from_array(matrix, warehouses)
+    graph = GridGraph(grid, cache=_cache)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph")
+        graph.export(path, format)
+        with open(path, "rb") as file:
+            return file.read(), time.perf_counter() - start
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class GraphService:
+    """Local HTTP service that builds graphs from grids on a process pool.
+
+    POST /graphs?format=<export format> takes either a JSON object of Grid generator options
+    (width, height, seed, ...) or a raw .npy grid with its warehouse ids in ?warehouses=1,5,9, and
+    answers with the exported graph. Builds wait in a queue of at most queue_size; beyond that
+    requests are turned away with 503 and Retry-After. Identical requests arriving while one is
+    queued or building share its result. GET /metrics reports counts, throughput and latencies.
+    Generated grids are limited to max_cells cells and uploaded ones to max_body_bytes. When a
+    worker dies the pool is replaced and the builds it held are answered with 503.
+    """
+
+    def __init__(self, workers: int | None = None, queue_size: int = 64, cache_directory: str | None = None, max_body_bytes: int = 1 << 28,
+                 max_cells: int = 1 << 26):
+        if queue_size < 1:
+            raise ValueError("Queue size must be positive.")
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.cache_directory = cache_directory
+        self.max_body_bytes = max_body_bytes
+        self.max_cells = max_cells
+        self.counters = {"requests": 0, "builds": 0, "failed": 0, "rejected": 0, "deduplicated": 0, "pool_restarts": 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._build_seconds = deque(maxlen=LATENCY_WINDOW)
+        self._in_flight = {}
+        self._queue = None
+        self._pool = None
+        self._dispatchers = []
+        self._server = None
+        self._started = None
+        self._connections = set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, path: str | None = None):
+        """Start the pool and listen on host:port, or on the Unix socket at path when given."""
+        await self._start_pool()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        self._started = time.perf_counter()
+        return self._server
+
+    async def _start_pool(self):
+        loop = asyncio.get_running_loop()
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.cache_directory,))
+        # Start every worker now, so the first requests do not wait for the imports.
+        try:
+            await asyncio.gather(*(loop.run_in_executor(self._pool, time.sleep, 0) for _ in range(self.workers)))
+        except BrokenProcessPool as error:
+            self._pool.shutdown(cancel_futures=True)
+            raise RuntimeError("The build workers failed to start.") from error
+
+    async def _restart_pool(self, broken: ProcessPoolExecutor):
+        # Every dispatcher holding a build on the broken pool gets here; only the first replaces it.
+        if self._pool is broken:
+            self.counters["pool_restarts"] += 1
+            broken.shutdown(cancel_futures=True)
+            await self._start_pool()
+
+    def address(self):
+        """Return the (host, port) or the socket path the service listens on; port 0 picks a free port."""
+        return self._server.sockets[0].getsockname()
+
+    async def close(self):
+        self._server.close()
+        # Idle keep-alive connections would otherwise keep their handlers waiting for a next request.
+        for writer in list(self._connections):
+            writer.close()
+        while self._connections:
+            await asyncio.sleep(0.01)
+        await self._server.wait_closed()
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        self._pool.shutdown(cancel_futures=True)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            task, result = await self._queue.get()
+            pool = self._pool
+            try:
+                data, seconds = await loop.run_in_executor(pool, _build_in_worker, task)
+                self.counters["builds"] += 1
+                self._build_seconds.append(seconds)
+                result.set_result(data)
+            except BrokenProcessPool:
+                # The build may be what killed the worker, so it is not retried.
+                self.counters["failed"] += 1
+                result.set_exception(ServiceError(503, "A build worker died, retry later."))
+                await self._restart_pool(pool)
+            except Exception as error:
+                self.counters["failed"] += 1
+                result.set_exception(error)
+            finally:
+                self._queue.task_done()
+
+    async def build(self, kind: str, payload, warehouses: list[int], format: str) -> tuple[bytes, bool]:
+        """Return the exported graph, and whether it was shared with an identical request already in flight."""
+        if format not in CONTENT_TYPES:
+            raise ServiceError(400, f"Format must be one of {', '.join(CONTENT_TYPES)}.")
+        digest = hashlib.blake2b(f"{kind}|{format}|{sorted(warehouses)}|".encode(), digest_size=20)
+        digest.update(payload if kind == "npy" else json.dumps(payload, sort_keys=True).encode())
+        key = digest.hexdigest()
+
+        result = self._in_flight.get(key)
+        shared = result is not None
+        if shared:
+            self.counters["deduplicated"] += 1
+        else:
+            result = asyncio.get_running_loop().create_future()
+            try:
+                self._queue.put_nowait(((kind, payload, warehouses, format), result))
+            except asyncio.QueueFull:
+                self.counters["rejected"] += 1
+                raise ServiceError(503, "The build queue is full, retry later.")
+            self._in_flight[key] = result
+            result.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            return await asyncio.shield(result), shared
+        except (TypeError, ValueError) as error:
+            raise ServiceError(400, str(error))
+
+    def metrics(self) -> dict:
+        uptime = time.perf_counter() - self._started if self._started is not None else 0.0
+        latencies = sorted(self._latencies)
+
+        def percentile(values, fraction):
+            return values[min(int(fraction * len(values)), len(values) - 1)] if values else None
+
+        return {
+            **self.counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": len(self._in_flight),
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "uptime_seconds": uptime,
+            "builds_per_second": self.counters["builds"] / uptime if uptime else 0.0,
+            "latency_seconds": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99)},
+            "build_seconds_mean": sum(self._build_seconds) / len(self._build_seconds) if self._build_seconds else None,
+        }
+
+    async def _respond(self, request: tuple) -> tuple[int, str, bytes, dict]:
+        method, target, headers, body = request
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            return 200, "application/json", b'{"status": "ok"}', {}
+        if url.path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics()).encode(), {}
+        if url.path != "/graphs":
+            raise ServiceError(404, f"No such resource: {url.path}")
+        if method != "POST":
+            raise ServiceError(405, "Graphs are built with POST.")
+
+        self.counters["requests"] += 1
+        start = time.perf_counter()
+        format = query.get("format", "binary")
+        if headers.get("content-type", "").startswith("application/json"):
+            try:
+                options = json.loads(body)
+            except ValueError:
+                raise ServiceError(400, "The body is not valid JSON.")
+            if not isinstance(options, dict) or not options.keys() <= GENERATOR_OPTIONS or not {"width", "height"} <= options.keys():
+                raise ServiceError(400, f"Generator options are width and height, and optionally {', '.join(sorted(GENERATOR_OPTIONS - {'width', 'height'}))}.")
+            if not all(type(options[name]) is int for name in ("width", "height")):
+                raise ServiceError(400, "Width and height must be integers.")
+            if options["width"] * options["height"] > self.max_cells:
+                raise ServiceError(413, f"Generated grids are limited to {self.max_cells} cells.")
+            kind, payload, warehouses = "generate", options, []
+        else:
+            try:
+                warehouses = [int(id) for id in query.get("warehouses", "").split(",") if id]
+            except ValueError:
+                raise ServiceError(400, "Warehouses must be a comma separated list of building ids.")
+            kind, payload = "npy", body
+        data, shared = await self.build(kind, payload, warehouses, format)
+        self._latencies.append(time.perf_counter() - start)
+        return 200, CONTENT_TYPES[format], data, {"X-Deduplicated": "1" if shared else "0"}
+
+    async def _read_request(self, reader) -> tuple | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ServiceError(400, "Malformed request line.")
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise ServiceError(400, "Content-Length must be an integer.")
+        if length < 0:
+            raise ServiceError(400, "Content-Length must not be negative.")
+        if length > self.max_body_bytes:
+            raise ServiceError(413, f"Bodies are limited to {self.max_body_bytes} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _handle(self, reader, writer):
+        """Serve the requests of one connection, keeping it open until the client closes it or asks to."""
+        self._connections.add(writer)
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request[2].get("connection", "").lower() != "close"
+                    status, content_type, data, extra = await self._respond(request)
+                except ServiceError as error:
+                    status, content_type, data = error.status, "application/json", json.dumps({"error": str(error)}).encode()
+                    extra = {"Retry-After": "1"} if error.status == 503 else {}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as error:
+                    status, content_type, data, extra = 500, "application/json", json.dumps({"error": str(error)}).encode(), {}
+                head = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}", f"Content-Length: {len(data)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, path: str | None = None, **options):
+    """Run a GraphService until cancelled; options are passed to GraphService."""
+    service = GraphService(**options)
+    server = await service.start(host, port, path)
+    print(f"Serving on {service.address()}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class ServiceClient:
+    """Blocking client for a GraphService on localhost, over TCP or a Unix socket. Raises ServiceError for error responses."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, path: str | None = None, timeout: float | None = None):
+        self._connection = _UnixConnection(path, timeout) if path is not None else http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, target: str, body: bytes | None = None, content_type: str | None = None) -> bytes:
+        self._connection.request(method, target, body, {"Content-Type": content_type} if content_type else {})
+        response = self._connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise ServiceError(response.status, json.loads(data)["error"])
+        return data
+
+    def generate(self, width: int, height: int, seed: int | None = None, format: str = "binary", **options) -> bytes:
+        """Return the exported graph of Grid(width, height, seed=seed, **options)."""
+        body = json.dumps({"width": width, "height": height, "seed": seed, **options}).encode()
+        return self._request("POST", "/graphs?" + urlencode({"format": format}), body, "application/json")
+
+    def build(self, grid, format: str = "binary") -> bytes:
+        """Return the exported graph of a Grid, sent as its .npy matrix and warehouse ids."""
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(grid.grid))
+        query = urlencode({"format": format, "warehouses": ",".join(str(id) for id in sorted(grid.warehouses))})
+        return self._request("POST", "/graphs?" + query, buffer.getvalue(), "application/octet-stream")
+
+    def metrics(self) -> dict:
+        return json.loads(self._request("GET", "/metrics"))
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,44 @@
+import math
+import networkx as nx
+import numpy as np
+import pytest
+from contraction import ContractionIndex
+from test_routing import city, building_ids, building_keys
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_contraction_index_matches_dijkstra(seed):
+    grid, graph = city(seed)
+    nx_graph = graph.get_graph()
+    core = graph.get_compact_graph()
+    index = graph.build_contraction_index()
+    buildings = building_ids(grid).tolist()
+    rng = np.random.default_rng(seed)
+    for source, target in rng.choice(buildings, (25, 2)).tolist():
+        source_key, target_key = building_keys(graph, [source, target])
+        try:
+            expected = nx.dijkstra_path_length(nx_graph, source_key, target_key)
+        except nx.NetworkXNoPath:
+            expected = math.inf
+        assert index.building_distance(core, source, target) == expected
+        path = index.building_path(core, source, target)
+        if math.isinf(expected):
+            assert path == []
+        else:
+            assert path[0] == source_key and path[-1] == target_key
+            assert sum(nx_graph.edges[u, v]['weight'] for u, v in zip(path, path[1:])) == expected
+
+
+def test_contraction_index_round_trips(tmp_path):
+    grid, graph = city(2)
+    core = graph.get_compact_graph()
+    index = graph.build_contraction_index()
+    index.save(str(tmp_path / "index.npz"))
+    loaded = ContractionIndex.load(str(tmp_path / "index.npz"), core)
+
+    for name in ("rank", "indptr", "targets", "weights", "middles"):
+        assert np.array_equal(getattr(loaded, name), getattr(index, name))
+    buildings = building_ids(grid).tolist()
+    assert loaded.building_distance(core, buildings[0], buildings[-1]) == index.building_distance(core, buildings[0], buildings[-1])
+    with pytest.raises(ValueError):
+        ContractionIndex.load(str(tmp_path / "index.npz"), city(0)[1].get_compact_graph())
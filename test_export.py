@@ -0,0 +1,74 @@
+import json
+import networkx as nx
+import pytest
+from grid import Grid
+from grid_graph import GridGraph
+from compact_graph import NODE_TYPES
+from export import export_graph, read_binary
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return GridGraph(Grid(24, 20, seed=4)).get_compact_graph()
+
+
+def expected_nodes(graph) -> list[tuple]:
+    return [(tuple(bbox), str(NODE_TYPES[code]), building_id) for bbox, code, building_id in graph.iter_node_rows()]
+
+
+def test_binary_round_trips(graph, tmp_path):
+    path = str(tmp_path / "graph.bin")
+    export_graph(graph, path, "binary")
+    loaded = read_binary(path)
+    assert expected_nodes(loaded) == expected_nodes(graph)
+    assert list(loaded.iter_edge_ids()) == list(graph.iter_edge_ids())
+
+
+def test_binary_rejects_truncated_files(graph, tmp_path):
+    path = tmp_path / "graph.bin"
+    export_graph(graph, str(path), "binary")
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(ValueError):
+        read_binary(str(path))
+
+
+def test_json_reads_back_with_networkx(graph, tmp_path):
+    path = tmp_path / "graph.json"
+    export_graph(graph, str(path), "json")
+    loaded = nx.node_link_graph(json.loads(path.read_text()), edges="edges")
+    assert [(tuple(data["bbox"]), data["type"]) for _, data in sorted(loaded.nodes(data=True))] == [node[:2] for node in expected_nodes(graph)]
+    assert {(min(u, v), max(u, v)): data["weight"] for u, v, data in loaded.edges(data=True)} == {(u, v): w for u, v, w in graph.iter_edge_ids()}
+
+
+def test_ndjson_has_one_record_per_line(graph, tmp_path):
+    path = tmp_path / "graph.ndjson"
+    export_graph(graph, str(path), "ndjson")
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    nodes = [record for record in records if record["kind"] == "node"]
+    edges = [record for record in records if record["kind"] == "edge"]
+    assert len(records) == len(nodes) + len(edges)
+    assert [(tuple(node["bbox"]), node["type"]) for node in nodes] == [node[:2] for node in expected_nodes(graph)]
+    assert [(edge["source"], edge["target"], edge["weight"]) for edge in edges] == list(graph.iter_edge_ids())
+
+
+def test_graphml_reads_back_with_networkx(graph, tmp_path):
+    path = str(tmp_path / "graph.graphml")
+    export_graph(graph, path, "graphml")
+    loaded = nx.read_graphml(path)
+    nodes = [loaded.nodes[f"n{node}"] for node in range(len(graph))]
+    assert [((data["min_x"], data["min_y"], data["max_x"], data["max_y"]), data["type"], data["building_id"]) for data in nodes] == expected_nodes(graph)
+    assert {tuple(sorted((int(u[1:]), int(v[1:])))): data["weight"] for u, v, data in loaded.edges(data=True)} == {(u, v): w for u, v, w in graph.iter_edge_ids()}
+
+
+def test_dot_lists_every_node_and_edge(graph, tmp_path):
+    path = tmp_path / "graph.dot"
+    export_graph(graph, str(path), "dot")
+    lines = path.read_text().splitlines()
+    assert lines[0] == "graph grid_graph {" and lines[-1] == "}"
+    assert sum(" -- " in line for line in lines) == graph.edge_count()
+    assert sum("pos=" in line for line in lines) == len(graph)
+
+
+def test_unknown_format_is_rejected(graph, tmp_path):
+    with pytest.raises(ValueError):
+        export_graph(graph, str(tmp_path / "graph"), "svg")
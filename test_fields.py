@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from grid import Grid, CellType
+import fields
+
+
+def manhattan(shape, rows, cols) -> np.ndarray:
+    """Return the distance from every cell to each of the given cells, shape (cells, rows, columns)."""
+    grid_rows, grid_cols = np.indices(shape)
+    return np.abs(grid_rows[np.newaxis] - rows[:, None, None]) + np.abs(grid_cols[np.newaxis] - cols[:, None, None])
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_road_distance_matches_brute_force(seed):
+    grid = Grid(9 + seed * 3, 8 + seed * 2, seed=seed)
+    rows, cols = np.nonzero(grid.grid == CellType.ROAD)
+    expected = manhattan(grid.grid.shape, rows, cols).min(axis=0)
+    result = grid.get_fields()
+
+    assert np.array_equal(result.road_distance(), expected)
+    nearest_rows, nearest_cols = result.nearest_road_cells(*np.indices(grid.grid.shape))
+    assert (grid.grid[nearest_rows, nearest_cols] == CellType.ROAD).all()
+    assert np.array_equal(np.abs(nearest_rows - np.indices(grid.grid.shape)[0]) + np.abs(nearest_cols - np.indices(grid.grid.shape)[1]), expected)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_nearest_warehouse_matches_brute_force(seed):
+    grid = Grid(10 + seed * 3, 9 + seed * 2, seed=seed)
+    cells = np.isin(grid.grid, list(grid.warehouses))
+    rows, cols = np.nonzero(cells)
+    expected = manhattan(grid.grid.shape, rows, cols).min(axis=0)
+    result = grid.get_fields()
+
+    assert np.array_equal(result.warehouse_distance(), expected)
+    nearest = result.nearest_warehouse()
+    assert np.isin(nearest, list(grid.warehouses)).all()
+    # The chosen warehouse is one at that distance; ties may go either way.
+    for warehouse in grid.warehouses:
+        rows, cols = np.nonzero(grid.grid == warehouse)
+        distance = manhattan(grid.grid.shape, rows, cols).min(axis=0)
+        assert (distance[nearest == warehouse] == expected[nearest == warehouse]).all()
+
+
+def test_fields_without_features_are_minus_one():
+    grid = Grid.from_array(np.full((6, 7), CellType.EMPTY), [])
+    result = grid.get_fields()
+    assert (result.road_distance() == -1).all() and (result.nearest_road() == -1).all()
+    assert (result.warehouse_distance() == -1).all() and (result.nearest_warehouse() == -1).all()
+
+
+def test_fields_are_recomputed_after_an_edit():
+    grid = Grid(12, 10, seed=0)
+    before = grid.get_fields().road_distance()
+    grid.add_road("vertical", 0)
+    assert (grid.get_fields().road_distance()[:, 0] == 0).all()
+    assert not np.array_equal(grid.get_fields().road_distance(), before)
+
+
+def test_banded_fields_match_one_band(monkeypatch):
+    grid = Grid(30, 25, seed=2)
+    whole = fields.distance_field(grid.grid, lambda block: block == CellType.ROAD)
+    monkeypatch.setattr(fields, "FIELD_BAND_CELLS", 40)
+    banded = fields.distance_field(grid.grid, lambda block: block == CellType.ROAD)
+    assert all(np.array_equal(a, b) for a, b in zip(whole, banded))
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import pytest
+import graph_cache
+import grid_graph
+from grid import Grid
+from grid_graph import GridGraph
+from graph_cache import GraphCache, grid_key
+
+
+def entry(seed: int = 0):
+    graph = GridGraph(Grid(12, 10, seed=seed))
+    return graph.get_compact_graph(), graph._buildings
+
+
+def age(cache: GraphCache, key: str, seconds: int):
+    """Set an entry's last use time, so the eviction order does not depend on the clock resolution."""
+    os.utime(cache._path(key), ns=(seconds * 10 ** 9, seconds * 10 ** 9))
+
+
+def test_store_and_load_round_trip(tmp_path):
+    cache = GraphCache(str(tmp_path))
+    graph, buildings = entry()
+    cache.store("a", graph, buildings)
+    loaded, loaded_buildings = cache.load("a")
+    assert list(loaded.iter_edges()) == list(graph.iter_edges())
+    assert np.array_equal(loaded_buildings, buildings)
+    assert cache.load("b") is None
+    assert cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+
+def test_eviction_removes_the_least_recently_used_first(tmp_path):
+    graph, buildings = entry()
+    cache = GraphCache(str(tmp_path))
+    for key in "abc":
+        cache.store(key, graph, buildings)
+    size = cache.size() // 3
+    age(cache, "a", 100)
+    age(cache, "b", 300)
+    age(cache, "c", 200)
+    cache.load("a")  # A hit makes it the most recently used.
+
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert [key for key, _, _ in cache.entries()] == ["b", "a"]
+    cache.max_bytes = size
+    cache.evict()
+    assert [key for key, _, _ in cache.entries()] == ["a"]
+    assert cache.stats["evictions"] == 2
+
+
+def test_store_keeps_the_cache_within_max_bytes(tmp_path):
+    graph, buildings = entry()
+    cache = GraphCache(str(tmp_path))
+    cache.store("a", graph, buildings)
+    cache.max_bytes = cache.size() * 2
+    for key in "bcde":
+        cache.store(key, graph, buildings)
+        assert cache.size() <= cache.max_bytes
+    assert len(cache.entries()) == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_corrupt_entries_are_misses_and_removed(tmp_path):
+    cache = GraphCache(str(tmp_path))
+    with open(cache._path("a"), "wb") as file:
+        file.write(b"not a graph")
+    assert cache.load("a") is None
+    assert not os.path.exists(cache._path("a"))
+
+
+def test_entry_evicted_after_it_was_read_is_still_a_hit(tmp_path, monkeypatch):
+    cache = GraphCache(str(tmp_path))
+    graph, buildings = entry()
+    cache.store("a", graph, buildings)
+
+    def evicted(path, *args, **kwargs):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(graph_cache.os, "utime", evicted)
+    assert cache.load("a") is not None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 0
+
+
+def test_key_changes_with_the_grid_warehouses_and_builder_version():
+    grid = Grid(12, 10, seed=0)
+    key = grid_key(grid, 1)
+    assert grid_key(grid, 2) != key
+    warehouse = next(iter(grid.warehouses))
+    grid.set_warehouse(warehouse, False)
+    assert grid_key(grid, 1) != key
+    grid.set_warehouse(warehouse)
+    assert grid_key(grid, 1) == key
+    grid.add_road("vertical", 0)
+    assert grid_key(grid, 1) != key
+
+
+def test_new_builder_version_misses_old_entries(tmp_path, monkeypatch):
+    grid = Grid(12, 10, seed=0)
+    cache = GraphCache(str(tmp_path))
+    GridGraph(grid, cache=cache)
+    GridGraph(grid, cache=cache)
+    assert cache.stats["hits"] == 1
+
+    monkeypatch.setattr(grid_graph, "BUILDER_VERSION", grid_graph.BUILDER_VERSION + 1)
+    GridGraph(grid, cache=cache)
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+
+def test_negative_size_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        GraphCache(str(tmp_path), max_bytes=-1)
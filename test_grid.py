@@ -0,0 +1,65 @@
+import networkx as nx
+import numpy as np
+import pytest
+from grid import Grid, CellType, grid_dtype
+from grid_graph import GridGraph
+
+
+@pytest.mark.parametrize("max_building_id, dtype", [(127, np.int8), (128, np.int16), (32767, np.int16), (32768, np.int32)])
+def test_grid_dtype_holds_the_largest_id(max_building_id, dtype):
+    assert grid_dtype(max_building_id) == dtype
+    assert np.array([max_building_id, -1]).astype(grid_dtype(max_building_id))[0] == max_building_id
+
+
+def test_place_building_widens_the_grid_as_ids_grow():
+    grid = Grid(6, 6, seed=0)
+    assert grid.grid.dtype == np.int8
+    graph = GridGraph(grid)
+    y, x = map(int, np.argwhere(grid.grid == CellType.EMPTY)[0])
+    for _ in range(200):
+        grid.remove_building(grid.place_building(x, y, 1, 1))
+    building_id = grid.place_building(x, y, 1, 1)
+
+    assert building_id > np.iinfo(np.int8).max
+    assert grid.grid[y, x] == building_id
+    graph.update()
+    assert nx.utils.graphs_equal(graph.get_graph(), GridGraph(grid).get_graph())
+
+
+def road_grid() -> Grid:
+    """An 8x8 grid with a vertical road on column 3, a road of width 3 on rows 4-6 and a horizontal road on row 0."""
+    matrix = np.full((8, 8), CellType.EMPTY)
+    matrix[:, 3] = CellType.ROAD
+    matrix[4:7] = CellType.ROAD
+    matrix[0] = CellType.ROAD
+    return Grid.from_array(matrix, [])
+
+
+def test_close_road_rejects_part_of_a_wider_road():
+    grid = road_grid()
+    before = grid.grid.copy()
+    with pytest.raises(ValueError):
+        grid.close_road("horizontal", 5)
+    with pytest.raises(ValueError):
+        grid.close_road("horizontal", 2)
+    assert np.array_equal(grid.grid, before) and not grid.edits
+
+    grid.close_road("horizontal", 4, 3)
+    assert (grid.grid[4:7, 3] == CellType.ROAD).all()
+    assert (np.delete(grid.grid[4:7], 3, axis=1) == CellType.EMPTY).all()
+
+
+def test_close_road_on_the_grid_edge_keeps_crossing_roads():
+    grid = road_grid()
+    grid.close_road("horizontal", 0)
+    assert (grid.grid[:, 3] == CellType.ROAD).all()
+    assert (np.delete(grid.grid[0], 3) == CellType.EMPTY).all()
+
+
+def test_set_warehouse_rejects_removed_buildings():
+    grid = Grid(12, 12, seed=0)
+    building_id = int(grid.grid.max())
+    grid.remove_building(building_id)
+    with pytest.raises(ValueError):
+        grid.set_warehouse(building_id)
+    assert building_id not in grid.warehouses
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+from grid import Grid, CellType
+from grid_graph import GridGraph
+from graph_cache import GraphCache
+from runs import group_strips
+
+MODES = {
+    "vectorized": {},
+    "threads": {'workers': 2, 'executor': "thread"},
+    "processes": {'workers': 2},
+    "tiled": {'tile_size': 5},
+    "tiled processes": {'tile_size': 7, 'workers': 2},
+    "run_length": {'run_length': True},
+    "tiled run_length": {'tile_size': 6, 'run_length': True},
+}
+GRIDS = [(7 + seed % 9 * 3, 9 + seed % 5 * 4, seed, max_road_width) for max_road_width in (1, 2, 3) for seed in range(8)]
+
+
+def graph_sets(graph: GridGraph) -> tuple[set, dict]:
+    """Return the node keys and the weight of every edge of a built graph."""
+    nx_graph = graph.get_graph()
+    return set(nx_graph.nodes), {frozenset((u, v)): data['weight'] for u, v, data in nx_graph.edges(data=True)}
+
+
+def reference(grid: Grid) -> tuple[set, dict]:
+    return graph_sets(GridGraph(grid, vectorized=False))
+
+
+def edit(grid: Grid, rng: np.random.Generator):
+    """Make one random edit through the Grid methods, or none when the chosen one is invalid."""
+    operation = rng.integers(6)
+    ids = np.unique(grid.grid[grid.grid >= CellType.BUILDING])
+    try:
+        if operation == 0 and len(ids):
+            grid.remove_building(int(rng.choice(ids)))
+        elif operation == 1:
+            width, height = (int(size) for size in rng.integers(1, 4, 2))
+            grid.place_building(int(rng.integers(0, grid.width - width + 1)), int(rng.integers(0, grid.height - height + 1)), width, height)
+        elif operation == 2 and len(ids):
+            grid.set_warehouse(int(rng.choice(ids)), bool(rng.integers(2)))
+        elif operation == 3:
+            orientation = "horizontal" if rng.integers(2) else "vertical"
+            size = grid.height if orientation == "horizontal" else grid.width
+            grid.add_road(orientation, int(rng.integers(0, size - 2)), int(rng.integers(1, 4)))
+        else:
+            orientation = "horizontal" if operation == 4 else "vertical"
+            strips = group_strips((grid.grid == CellType.ROAD).all(axis=1 if orientation == "horizontal" else 0))
+            if strips:
+                grid.close_road(orientation, *strips[rng.integers(len(strips))])
+    except ValueError:
+        pass
+
+
+@pytest.mark.parametrize("options", MODES.values(), ids=MODES.keys())
+@pytest.mark.parametrize("width, height, seed, max_road_width", GRIDS)
+def test_build_matches_the_reference(width, height, seed, max_road_width, options):
+    grid = Grid(width, height, seed=seed, max_road_width=max_road_width)
+    assert graph_sets(GridGraph(grid, **options)) == reference(grid)
+
+
+UPDATE_MODES = {"tiles of 3": {'tile_size': 3}, "tiles of 4": {'tile_size': 4}, "tiles of 5": {'tile_size': 5}, "untiled": {},
+                "run_length": {'run_length': True}}
+
+
+@pytest.mark.parametrize("options", UPDATE_MODES.values(), ids=UPDATE_MODES.keys())
+@pytest.mark.parametrize("first_seed", range(0, 200, 50))
+def test_update_matches_a_fresh_build(first_seed, options):
+    # Small tiles put many edits next to a tile border, where a stale neighbouring tile would show.
+    for seed in range(first_seed, first_seed + 50):
+        grid = Grid(10 + seed % 7, 9 + seed % 5, seed=seed, max_road_width=1 + seed % 3)
+        graph = GridGraph(grid, **options)
+        rng = np.random.default_rng(seed)
+        for _ in range(4):
+            edit(grid, rng)
+            graph.update()
+            assert graph_sets(graph) == reference(grid), seed
+        assert list(graph.get_graph().edges) == list(GridGraph(grid, **options).get_graph().edges), seed
+
+
+@pytest.mark.parametrize("options", [MODES["vectorized"], MODES["tiled"], MODES["run_length"]], ids=["vectorized", "tiled", "run_length"])
+@pytest.mark.parametrize("seed", range(4))
+def test_update_matches_the_reference_after_several_edits(seed, options):
+    grid = Grid(16 + seed * 3, 14, seed=seed, max_road_width=3)
+    graph = GridGraph(grid, **options)
+    rng = np.random.default_rng(seed)
+    for _ in range(6):
+        for _ in range(int(rng.integers(1, 4))):
+            edit(grid, rng)
+        graph.update()
+        assert graph_sets(graph) == reference(grid)
+
+
+def test_update_matches_the_reference_once_ids_outgrow_the_dtype():
+    grid = Grid(12, 12, seed=0, max_road_width=3)
+    graph = GridGraph(grid, run_length=True)
+    y, x = (int(index) for index in np.argwhere(grid.grid == CellType.EMPTY)[0])
+    for _ in range(300):
+        grid.remove_building(grid.place_building(x, y, 1, 1))
+    grid.place_building(x, y, 1, 1)
+    graph.update()
+    assert graph_sets(graph) == reference(grid)
+
+
+@pytest.mark.parametrize("width, height, seed, max_road_width", GRIDS[::5])
+def test_cached_build_matches_the_reference(tmp_path, width, height, seed, max_road_width):
+    grid = Grid(width, height, seed=seed, max_road_width=max_road_width)
+    cache = GraphCache(str(tmp_path))
+    built, loaded = GridGraph(grid, cache=cache), GridGraph(grid, cache=cache)
+    assert cache.stats["hits"] == 1
+    assert graph_sets(built) == graph_sets(loaded) == reference(grid)
+
+
+@pytest.mark.parametrize("options", [{}, {'workers': 2}, {'tile_size': 4}, {'run_length': True}])
+def test_road_strip_along_the_edge_keeps_its_ends_apart(options):
+    grid = Grid(7, 9, seed=3, max_road_width=3)
+    nodes, _ = reference(grid)
+
+    assert (6, 0, 6, 0) in nodes and (6, 6, 6, 6) in nodes
+    assert graph_sets(GridGraph(grid, **options)) == reference(grid)
@@ -0,0 +1,71 @@
+import pstats
+import sys
+import tracemalloc
+from contextlib import nullcontext
+import pytest
+import instrumentation
+from grid import Grid
+from grid_graph import GridGraph
+from instrumentation import BuildStats
+
+
+def test_stats_off_records_nothing_and_installs_no_profiler(monkeypatch):
+    assert isinstance(instrumentation.stage(None, "stage"), nullcontext)
+    assert isinstance(instrumentation.profiling(None), nullcontext)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("instrumentation used with stats off")
+
+    monkeypatch.setattr(BuildStats, "stage", fail)
+    monkeypatch.setattr(BuildStats, "count", fail)
+    monkeypatch.setattr(BuildStats, "profiling", fail)
+    profilers = []
+    create_edges = GridGraph._create_edges
+
+    def recording(self, *args, **kwargs):
+        profilers.append(sys.getprofile())
+        return create_edges(self, *args, **kwargs)
+
+    monkeypatch.setattr(GridGraph, "_create_edges", recording)
+    graph = GridGraph(Grid(20, 16, seed=0))
+    assert graph.get_stats() is None
+    assert profilers == [None] and not tracemalloc.is_tracing()
+
+
+def test_stages_and_counters_are_recorded():
+    records = []
+    stats = BuildStats(trace_memory=True, callback=lambda name, record: records.append(name))
+    GridGraph(Grid(20, 16, seed=0, stats=stats), stats=stats)
+    assert "Grid._generate_random_layout" in stats.stages and "GridGraph._create_edges" in stats.stages
+    assert list(stats.stages) == records
+    assert all(record["wall"] >= 0 and "peak_bytes" in record for record in stats.stages.values())
+    assert stats.counters["buildings_placed"] > 0 and stats.counters["edges_added"] > 0
+    assert not tracemalloc.is_tracing()
+    assert "GridGraph._create_edges" in stats.summary()
+
+
+def test_counters_accumulate_across_runs():
+    grid = Grid(20, 16, seed=0)
+    once, twice = BuildStats(), BuildStats()
+    GridGraph(grid, stats=once)
+    GridGraph(grid, stats=twice)
+    GridGraph(grid, stats=twice)
+    assert once.counters and twice.counters == {name: 2 * value for name, value in once.counters.items()}
+
+
+@pytest.mark.parametrize("profile_format", ["pstats", "collapsed"])
+def test_profile_merges_every_run(tmp_path, profile_format):
+    path = str(tmp_path / "profile")
+    stats = BuildStats(profile=path, profile_format=profile_format)
+    GridGraph(Grid(20, 16, seed=0, stats=stats), stats=stats)
+    if profile_format == "pstats":
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+    else:
+        with open(path) as file:
+            functions = {frame.rsplit(":", 1)[-1].rsplit(".", 1)[-1] for line in file for frame in line.rsplit(" ", 1)[0].split(";")}
+    assert {"_generate_random_layout_fast", "_create_edges"} <= functions
+
+
+def test_unknown_profile_format_is_rejected():
+    with pytest.raises(ValueError):
+        BuildStats(profile_format="json")
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from PIL import Image
+from grid import Grid, CellType
+import raster
+
+
+@pytest.fixture(scope="module")
+def grid():
+    return Grid(23, 17, seed=5)
+
+
+def expected_pixels(grid: Grid) -> np.ndarray:
+    """Colour every cell one at a time."""
+    pixels = np.empty((grid.height, grid.width, 3), dtype=np.uint8)
+    for y in range(grid.height):
+        for x in range(grid.width):
+            value = grid.grid[y, x]
+            pixels[y, x] = (raster.WHITE if value == CellType.EMPTY else raster.BLACK if value == CellType.ROAD
+                            else raster.RED if value in grid.warehouses else raster.BLUE)
+    return pixels
+
+
+def test_render_colours_every_cell(grid):
+    image = raster.render_region(grid, pixels_per_cell=1)
+    assert image.size == (grid.width, grid.height)
+    assert np.array_equal(np.asarray(image), expected_pixels(grid))
+
+
+def test_render_scales_and_crops(grid):
+    image = np.asarray(raster.render_region(grid, (3, 2, 11, 9), pixels_per_cell=3))
+    assert image.shape == (7 * 3, 8 * 3, 3)
+    assert np.array_equal(image[::3, ::3], expected_pixels(grid)[2:9, 3:11])
+
+
+def test_banded_render_matches_one_band(grid, monkeypatch):
+    whole = np.asarray(raster.render_region(grid, pixels_per_cell=1))
+    monkeypatch.setattr(raster, "BAND_CELLS", 30)
+    assert np.array_equal(np.asarray(raster.render_region(grid, pixels_per_cell=1)), whole)
+
+
+def test_tiles_cover_the_grid(grid, tmp_path):
+    paths = raster.save_tiles(grid, str(tmp_path), tile_size=10, pixels_per_cell=1)
+    assert len(paths) == 2 * 3
+    mosaic = np.empty((grid.height, grid.width, 3), dtype=np.uint8)
+    for path in paths:
+        row, column = (int(part) for part in path[:-4].split("_")[-2:])
+        tile = np.asarray(Image.open(path))
+        mosaic[row * 10:row * 10 + tile.shape[0], column * 10:column * 10 + tile.shape[1]] = tile
+    assert np.array_equal(mosaic, expected_pixels(grid))
+
+
+def test_overview_keeps_roads_visible(grid):
+    image = np.asarray(raster.render_overview(grid, max_size=6))
+    factor = 4
+    assert image.shape == (-(-grid.height // factor), -(-grid.width // factor), 3)
+    roads = (grid.grid == CellType.ROAD)
+    for y in range(image.shape[0]):
+        for x in range(image.shape[1]):
+            if roads[y * factor:(y + 1) * factor, x * factor:(x + 1) * factor].any():
+                assert tuple(image[y, x]) == raster.BLACK
+
+
+def test_labels_are_drawn_at_building_centroids(grid):
+    labels = raster.building_labels(grid)
+    building_id = int(grid.grid.max())
+    y, x = np.nonzero(grid.grid == building_id)
+    centroid_x, centroid_y, _ = labels[building_id]
+    assert (centroid_x, centroid_y) == pytest.approx((x.mean(), y.mean()))
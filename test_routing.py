@@ -0,0 +1,52 @@
+import math
+import networkx as nx
+import numpy as np
+import pytest
+from grid import Grid, CellType
+from grid_graph import GridGraph
+
+
+def city(seed: int) -> tuple[Grid, GridGraph]:
+    grid = Grid(20 + seed * 4, 18 + seed * 2, seed=seed, max_road_width=1 + seed % 3)
+    return grid, GridGraph(grid)
+
+
+def building_keys(graph: GridGraph, buildings) -> list[tuple]:
+    core = graph.get_compact_graph()
+    return [core.node_key(node) for node in core.building_nodes(buildings).tolist()]
+
+
+def building_ids(grid: Grid) -> np.ndarray:
+    return np.unique(grid.grid[grid.grid >= CellType.BUILDING])
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_router_matches_multi_source_dijkstra(seed):
+    grid, graph = city(seed)
+    nx_graph = graph.get_graph()
+    buildings = building_ids(grid)
+    warehouses = sorted(grid.warehouses)
+    distances, _ = nx.multi_source_dijkstra(nx_graph, building_keys(graph, warehouses))
+    router = graph.get_router()
+
+    nearest, distance, paths = router.nearest_warehouse(buildings), router.distance(buildings), router.paths(buildings)
+    for key, warehouse, length, path in zip(building_keys(graph, buildings), nearest.tolist(), distance.tolist(), paths):
+        if key not in distances:
+            assert warehouse == -1 and math.isinf(length) and path == []
+            continue
+        assert length == distances[key]
+        assert warehouse in warehouses
+        assert nx.dijkstra_path_length(nx_graph, key, building_keys(graph, [warehouse])[0]) == length
+        assert path[0] == key and path[-1] == building_keys(graph, [warehouse])[0]
+        assert sum(nx_graph.edges[u, v]['weight'] for u, v in zip(path, path[1:])) == length
+
+
+def test_router_follows_graph_updates():
+    grid, graph = city(1)
+    router = graph.get_router()
+    buildings = building_ids(grid)
+    router.distance(buildings)
+    warehouse = sorted(grid.warehouses)[0]
+    grid.set_warehouse(warehouse, False)
+    graph.update()
+    assert warehouse not in router.nearest_warehouse(buildings).tolist()
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from grid import Grid, CellType
+from runs import RunLengthGrid, _encode_lines, _splice_lines, group_strips
+
+ARRAYS = ("row_pointers", "row_starts", "row_values", "column_pointers", "column_starts", "column_values")
+
+
+def decode(runs: RunLengthGrid) -> tuple[np.ndarray, np.ndarray]:
+    """Expand the row runs and the column runs back into two dense matrices."""
+    rows, cols = runs.shape
+    by_row, by_column = np.empty(runs.shape, dtype=np.int64), np.empty(runs.shape, dtype=np.int64)
+    for row in range(rows):
+        for start, end, value in zip(*runs.row_runs(row)):
+            by_row[row, start:end] = value
+    for column in range(cols):
+        for start, end, value in zip(*runs.column_runs(column)):
+            by_column[start:end, column] = value
+    return by_row, by_column
+
+
+def assert_same_encoding(runs: RunLengthGrid, other: RunLengthGrid):
+    for name in ARRAYS:
+        assert np.array_equal(getattr(runs, name), getattr(other, name)), name
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_encoding_decodes_to_the_matrix(seed):
+    matrix = Grid(9 + seed * 5, 7 + seed * 3, seed=seed).grid
+    by_row, by_column = decode(RunLengthGrid(matrix))
+    assert np.array_equal(by_row, matrix) and np.array_equal(by_column, matrix)
+
+
+def test_runs_are_maximal():
+    matrix = np.array([[1, 1, 0, 0, 0], [2, 2, 2, 2, 2], [0, 1, 0, 1, 0]])
+    runs = RunLengthGrid(matrix)
+    assert runs.row_pointers.tolist() == [0, 2, 3, 8]
+    assert runs.row_starts.tolist() == [0, 2, 0, 0, 1, 2, 3, 4]
+    assert [array.tolist() for array in runs.column_runs(4)] == [[0, 1, 2], [1, 2, 3], [0, 2, 0]]
+    assert all(len(array) == 0 for array in runs.row_runs(3))
+
+
+def test_encoding_in_bands_matches_one_band(monkeypatch):
+    matrix = Grid(40, 30, seed=1).grid
+    whole = RunLengthGrid(matrix)
+    monkeypatch.setattr("runs.ENCODE_BAND_CELLS", 50)
+    assert_same_encoding(RunLengthGrid(matrix), whole)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_splice_matches_a_dense_encode(seed):
+    rng = np.random.default_rng(seed)
+    before = rng.integers(-1, 3, rng.integers(1, 12, 2))
+    after = before.copy()
+    lines = np.unique(rng.integers(0, len(before), rng.integers(0, len(before) + 1)))
+    after[lines] = rng.integers(-1, 3, (len(lines), before.shape[1]))
+
+    spliced = _splice_lines(_encode_lines(before), lines, _encode_lines(after[lines]))
+    for array, expected in zip(spliced, _encode_lines(after)):
+        assert np.array_equal(array, expected)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_update_matches_a_dense_encode(seed):
+    rng = np.random.default_rng(seed)
+    matrix = Grid(8 + seed, 10, seed=seed).grid.copy()
+    runs = RunLengthGrid(matrix)
+    for _ in range(3):
+        x, y = rng.integers(0, matrix.shape[0]), rng.integers(0, matrix.shape[1])
+        height, width = rng.integers(1, 4, 2)
+        matrix[x:x + height, y:y + width] = rng.integers(-1, 5)
+        rows, columns = range(x, min(x + height, matrix.shape[0])), range(y, min(y + width, matrix.shape[1]))
+        encoded = runs.update(matrix, rows, columns)
+        assert_same_encoding(runs, RunLengthGrid(matrix))
+        assert encoded == runs.row_pointers[rows.stop] - runs.row_pointers[rows.start] + runs.column_pointers[columns.stop] - runs.column_pointers[columns.start]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_building_extents_match_the_cells(seed):
+    grid = Grid(15 + seed * 4, 12, seed=seed)
+    cell_count, min_x, min_y, max_x, max_y = RunLengthGrid(grid.grid).building_extents(grid.next_building_id)
+    for building_id in range(CellType.BUILDING, grid.next_building_id):
+        x, y = np.nonzero(grid.grid == building_id)
+        assert cell_count[building_id] == len(x)
+        assert (min_x[building_id], min_y[building_id], max_x[building_id], max_y[building_id]) == (x.min(), y.min(), x.max(), y.max())
+
+
+def test_building_starts_are_the_first_cell_of_each_run():
+    matrix = np.array([[3, 3, 0, 4, -1, 4, 4]])
+    runs = RunLengthGrid(matrix)
+    assert runs.row_building_starts(0, 7) == [(0, 3), (3, 4), (5, 4)]
+    assert runs.row_building_starts(0, 5) == [(0, 3), (3, 4)]
+    assert runs.column_building_starts(2, 1) == []
+
+
+def test_group_strips():
+    assert group_strips(np.array([True, True, False, True, False, True, True, True])) == [(0, 2), (3, 1), (5, 3)]
+    assert group_strips(np.zeros(4, dtype=bool)) == []
@@ -0,0 +1,98 @@
+import asyncio
+import http.client
+import io
+import json
+import numpy as np
+import pytest
+from grid import Grid
+from grid_graph import GridGraph
+from export import read_binary_from
+from service import GraphService, ServiceClient, ServiceError
+
+
+def serve(check, **options):
+    """Run check(service, client) against a running service, the client calls on a thread beside the event loop."""
+    async def main():
+        service = GraphService(**{'workers': 1, **options})
+        await service.start("127.0.0.1", 0)
+        client = ServiceClient(*service.address(), timeout=60)
+        try:
+            return await check(service, client)
+        finally:
+            client.close()
+            await service.close()
+    return asyncio.run(main())
+
+
+def status(call) -> int:
+    with pytest.raises(ServiceError) as error:
+        call()
+    return error.value.status
+
+
+def test_generated_graph_matches_a_local_build():
+    async def check(service, client):
+        return await asyncio.to_thread(client.generate, 12, 10, seed=3), await asyncio.to_thread(client.build, Grid(9, 8, seed=1))
+    generated, uploaded = serve(check)
+    for data, grid in ((generated, Grid(12, 10, seed=3)), (uploaded, Grid(9, 8, seed=1))):
+        assert list(read_binary_from(io.BytesIO(data)).iter_edges()) == list(GridGraph(grid).get_compact_graph().iter_edges())
+
+
+def test_full_queue_is_turned_away_and_identical_requests_share_a_build():
+    async def check(service, client):
+        # Every build is queued before the dispatcher runs, so one fills the queue of one.
+        options = {"width": 30, "height": 30, "seed": 0}
+        return await asyncio.gather(service.build("generate", options, [], "binary"), service.build("generate", {**options, "seed": 1}, [], "binary"),
+                                    service.build("generate", dict(options), [], "binary"), return_exceptions=True), service.counters
+    (first, rejected, shared), counters = serve(check, queue_size=1)
+    assert first == (shared[0], False) and shared[1]
+    assert isinstance(rejected, ServiceError) and rejected.status == 503
+    assert counters["builds"] == 1 and counters["rejected"] == 1 and counters["deduplicated"] == 1
+
+
+def test_rejected_requests_ask_to_retry():
+    async def check(service, client):
+        def request():
+            connection = http.client.HTTPConnection(*service.address())
+            connection.request("POST", "/graphs", json.dumps({"width": 30, "height": 30}), {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            return response.status, response.getheader("Retry-After")
+        # A full queue no dispatcher reads from, so the request cannot fit.
+        service._queue = asyncio.Queue(1)
+        service._queue.put_nowait((None, asyncio.get_running_loop().create_future()))
+        return await asyncio.to_thread(request)
+    assert serve(check, queue_size=1) == (503, "1")
+
+
+@pytest.mark.parametrize("body, expected", [
+    ({"width": 101, "height": 100}, 413),
+    ({"width": "10", "height": 10}, 400),
+    ({"width": 10}, 400),
+    ({"width": 10, "height": 10, "depth": 1}, 400),
+    ({"width": 10, "height": 10, "max_road_width": "wide"}, 400),
+])
+def test_invalid_generator_options_are_rejected(body, expected):
+    async def check(service, client):
+        return await asyncio.to_thread(status, lambda: client._request("POST", "/graphs", json.dumps(body).encode(), "application/json"))
+    assert serve(check, max_cells=10000) == expected
+
+
+@pytest.mark.parametrize("content_length, expected", [("abc", 400), ("-1", 400), (str(1 << 20), 413)])
+def test_invalid_bodies_are_rejected(content_length, expected):
+    async def check(service, client):
+        def request():
+            connection = http.client.HTTPConnection(*service.address())
+            connection.putrequest("POST", "/graphs")
+            connection.putheader("Content-Length", content_length)
+            connection.endheaders()
+            return connection.getresponse().status
+        return await asyncio.to_thread(request)
+    assert serve(check, max_body_bytes=1 << 10) == expected
+
+
+def test_unknown_format_and_warehouses_are_rejected():
+    async def check(service, client):
+        grid = np.asarray(Grid(9, 8, seed=1).grid)
+        return (await asyncio.to_thread(status, lambda: client.generate(9, 8, format="png")),
+                await asyncio.to_thread(status, lambda: client._request("POST", "/graphs?warehouses=a", grid.tobytes(), "application/octet-stream")))
+    assert serve(check) == (400, 400)
@@ -0,0 +1,78 @@
+import numpy as np
+from grid import CellType
+from road_features import classify_road_cells, count_road_cells, intersection_corner_records
+
+
+def iter_tiles(rows: int, cols: int, tile_size: int):
+    """Yield the (start_x, start_y, end_x, end_y) core of every tile, row by row."""
+    for start_x in range(0, rows, tile_size):
+        for start_y in range(0, cols, tile_size):
+            yield start_x, start_y, min(start_x + tile_size, rows), min(start_y + tile_size, cols)
+
+
+def read_tile(matrix: np.ndarray, core, halo: int = 1) -> tuple[np.ndarray, tuple]:
+    """Copy a tile core together with a halo of cells around it, clipped to the grid.
+
+    Returns the window and the core's position inside it.
+    """
+    rows, cols = matrix.shape
+    start_x, start_y, end_x, end_y = core
+    window_x, window_y = max(start_x - halo, 0), max(start_y - halo, 0)
+    window = np.array(matrix[window_x:min(end_x + halo, rows), window_y:min(end_y + halo, cols)])
+    return window, (start_x - window_x, start_y - window_y, end_x - window_x, end_y - window_y)
+
+
+def scan_tile(task) -> dict:
+    """Find the building extents and the intersection and road end corners of one tile.
+
+    task is (window, core, origin, grid_shape): the window read by read_tile with a halo of two
+    cells, the core inside it, the core's global origin and the full grid shape. The stencil runs
+    on the window, so every core cell and its neighbours are classified as on the whole grid.
+    """
+    window, core, origin, grid_shape = task
+    start_x, start_y, end_x, end_y = core
+    tile = window[start_x:end_x, start_y:end_y]
+
+    x, y = np.nonzero(tile >= CellType.BUILDING)
+    ids = tile[x, y].astype(np.int64)
+    present, inverse, cell_count = np.unique(ids, return_inverse=True, return_counts=True)
+    min_x = np.full(len(present), np.iinfo(np.int64).max, dtype=np.int64)
+    min_y = np.full(len(present), np.iinfo(np.int64).max, dtype=np.int64)
+    max_x = np.full(len(present), -1, dtype=np.int64)
+    max_y = np.full(len(present), -1, dtype=np.int64)
+    np.minimum.at(min_x, inverse, x + origin[0])
+    np.minimum.at(min_y, inverse, y + origin[1])
+    np.maximum.at(max_x, inverse, x + origin[0])
+    np.maximum.at(max_y, inverse, y + origin[1])
+
+    road_matrix = np.where(window == CellType.ROAD, 0, 1)
+    intersection_corners, end_corners, inner = classify_road_cells(road_matrix)
+    intersections = intersection_corner_records(intersection_corners, inner, core, origin)
+    intersection_corners, end_corners = intersection_corners[start_x:end_x, start_y:end_y], end_corners[start_x:end_x, start_y:end_y]
+    x, y = np.nonzero(end_corners)
+
+    return {
+        'origin': origin,
+        'shape': tile.shape,
+        'buildings': (present, cell_count, min_x, min_y, max_x, max_y),
+        'intersections': intersections,
+        'end_corners': np.stack((x + origin[0], y + origin[1]), axis=1),
+        'counts': count_road_cells(road_matrix[start_x:end_x, start_y:end_y], intersection_corners, end_corners),
+    }
+
+
+def merge_building_extents(tiles: list[dict], building_count: int, grid_shape) -> tuple[np.ndarray, ...]:
+    """Combine the per-tile building extents into per-id (cell_count, min_x, min_y, max_x, max_y) arrays."""
+    cell_count = np.zeros(building_count, dtype=np.int64)
+    min_x = np.full(building_count, grid_shape[0], dtype=np.int64)
+    min_y = np.full(building_count, grid_shape[1], dtype=np.int64)
+    max_x = np.full(building_count, -1, dtype=np.int64)
+    max_y = np.full(building_count, -1, dtype=np.int64)
+    for tile in tiles:
+        ids, tile_count, tile_min_x, tile_min_y, tile_max_x, tile_max_y = tile['buildings']
+        np.add.at(cell_count, ids, tile_count)
+        np.minimum.at(min_x, ids, tile_min_x)
+        np.minimum.at(min_y, ids, tile_min_y)
+        np.maximum.at(max_x, ids, tile_max_x)
+        np.maximum.at(max_y, ids, tile_max_y)
+    return cell_count, min_x, min_y, max_x, max_y